@@ -0,0 +1,199 @@
+"""
+Run a file of natural language queries without prompts.
+
+Every line that starts with a query verb ("show me ...", "list ...") is
+parsed and executed against the selected database(s); headings, comments
+and blank lines are skipped, so commands.txt can be used as is. Result
+rows are streamed to the output as JSON Lines, or written as CSV once
+every query has run, while per-query timings are reported on stderr.
+CSV output holds every result row in memory until then, because its
+header needs the columns of all of them; use JSON Lines for large results.
+
+    python batch_runner.py commands.txt --db both --format jsonl --workers 4
+"""
+import argparse
+import contextlib
+import csv
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from decimal import Decimal
+
+from console_utils import ConsoleFormatter as cf
+from main import create_handler, initialize_database
+from utils import SHOW_SYNONYMS, parse_natural_language
+
+# Columns that lead every CSV record
+CSV_PREFIX_FIELDS = ["query_index", "backend", "question"]
+
+
+def read_questions(path):
+    """Return the query lines of a file, skipping headings, comments and blanks"""
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            question = line.strip()
+            words = question.lower().split()
+            if words and words[0] in SHOW_SYNONYMS:
+                questions.append(question)
+    return questions
+
+
+def to_json_value(value):
+    """Convert values returned by the drivers into JSON-friendly types"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+def normalize_row(plan, row):
+    """Give SQL and MongoDB rows the same shape"""
+    row = dict(row)
+    if plan.group_by and "_id" in row:
+        # $group returns the group key as _id
+        row = {plan.group_by: row.pop("_id"), **row}
+    return {key: to_json_value(value) for key, value in row.items()}
+
+
+def run_query(handler, db_type, index, question):
+    """Parse and execute one question; return its rows, timing and error if any"""
+    start = time.perf_counter()
+    try:
+        plan = parse_natural_language(question)
+        rows = [normalize_row(plan, row) for row in handler.execute_plan(plan)]
+        error = None
+    except Exception as e:
+        rows = []
+        error = str(e)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return {
+        "query_index": index,
+        "backend": db_type,
+        "question": question,
+        "rows": rows,
+        "elapsed_ms": elapsed_ms,
+        "error": error,
+    }
+
+
+class ResultWriter:
+    """
+    Thread-safe writer for JSON Lines or CSV output. JSON Lines records are
+    streamed as they come; CSV records are held until close(), so that the
+    header has every column any result row has (aggregate aliases, is_total,
+    join columns), whatever the backend. Memory use for CSV therefore grows
+    with the total number of result rows
+    """
+
+    def __init__(self, stream, output_format):
+        self.stream = stream
+        self.output_format = output_format
+        self.lock = threading.Lock()
+        self.records = []
+
+    def write(self, outcome):
+        prefix = {
+            "query_index": outcome["query_index"],
+            "backend": outcome["backend"],
+            "question": outcome["question"],
+        }
+        records = [{**prefix, **row} for row in outcome["rows"]]
+        if outcome["error"]:
+            records = [{**prefix, "error": outcome["error"]}]
+        with self.lock:
+            if self.output_format == "csv":
+                self.records.extend(records)
+                return
+            for record in records:
+                self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.stream.flush()
+
+    def close(self):
+        """Write the held CSV records under a header of all their columns, in order of appearance"""
+        if self.output_format != "csv":
+            return
+        with self.lock:
+            fields = dict.fromkeys(CSV_PREFIX_FIELDS)
+            for record in self.records:
+                fields.update(dict.fromkeys(key for key in record if key != "error"))
+            writer = csv.DictWriter(self.stream, fieldnames=[*fields, "error"])
+            writer.writeheader()
+            writer.writerows(self.records)
+            self.stream.flush()
+            self.records = []
+
+
+def run_batch(questions, db_types, writer, workers=1, log=sys.stderr):
+    """Execute every question on every backend and stream the results"""
+    handlers = {db_type: create_handler(db_type, workers) for db_type in db_types}
+    jobs = [(db_type, index, question) for db_type in db_types for index, question in enumerate(questions, 1)]
+
+    outcomes = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = [executor.submit(run_query, handlers[db_type], db_type, index, question)
+                   for db_type, index, question in jobs]
+        for future in as_completed(futures):
+            outcome = future.result()
+            writer.write(outcome)
+            outcomes.append(outcome)
+            status = cf.error(f"error: {outcome['error']}") if outcome["error"] else f"{len(outcome['rows'])} rows"
+            print(f"[{outcome['backend']}] #{outcome['query_index']:<3} {outcome['elapsed_ms']:8.1f} ms  {status}  {outcome['question']}", file=log)
+    total = time.perf_counter() - start
+
+    print(cf.header("BATCH SUMMARY"), file=log)
+    for db_type in db_types:
+        timings = sorted(o["elapsed_ms"] for o in outcomes if o["backend"] == db_type)
+        failed = sum(1 for o in outcomes if o["backend"] == db_type and o["error"])
+        if timings:
+            median = timings[len(timings) // 2]
+            print(cf.info(f"{db_type}: {len(timings)} queries, {failed} failed, "
+                          f"median {median:.1f} ms, max {timings[-1]:.1f} ms"), file=log)
+    print(cf.info(f"Total wall time: {total:.2f}s with {workers} worker(s)"), file=log)
+    return outcomes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run natural language queries from a file without prompts.")
+    parser.add_argument("query_file", help="file with one query per line, e.g. commands.txt")
+    parser.add_argument("--db", choices=["sql", "nosql", "sqlite", "memory", "both"], default="sql", help="database to query")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl", help="output format; csv keeps every result row in memory until all queries "
+                             "have run, jsonl streams rows as each query completes")
+    parser.add_argument("--output", help="output file (default: stdout)")
+    parser.add_argument("--workers", type=int, default=1, help="number of queries run concurrently")
+    parser.add_argument("--initialize", action="store_true", help="import the archive CSVs before querying")
+    parser.add_argument("--sync", action="store_true",
+                        help="apply only the changed rows of the archive CSVs before querying")
+    args = parser.parse_args(argv)
+
+    db_types = ["sql", "nosql"] if args.db == "both" else [args.db]
+    questions = read_questions(args.query_file)
+    if not questions:
+        print(cf.error(f"No queries found in {args.query_file}"), file=sys.stderr)
+        return 1
+
+    if args.initialize or args.sync:
+        # Keep import progress off stdout, which may carry the results
+        with contextlib.redirect_stdout(sys.stderr):
+            for db_type in db_types:
+                initialize_database(db_type, incremental=not args.initialize)
+
+    stream = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        # Handlers that load data on first use print progress; keep it off the results
+        writer = ResultWriter(stream, args.format)
+        with contextlib.redirect_stdout(sys.stderr):
+            outcomes = run_batch(questions, db_types, writer, workers=args.workers)
+        writer.close()
+    finally:
+        if args.output:
+            stream.close()
+    return 1 if any(o["error"] for o in outcomes) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""
+Micro-benchmark of parse_natural_language.
+
+Times every "show ..." question in commands.txt through the parser that
+predates the single-pass tokenizer (kept here as legacy_parse) and
+through the tokenizer, each uncached and behind an LRU cache of the same
+size, and prints the mean per-parse latency of each.
+
+    python benchmarks/bench_parser.py [--rounds 200]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from functools import lru_cache
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from query_plan import AVG_RATING, COUNT, Join, Predicate, QueryPlan, Sort
+from utils import normalize_command, parse_natural_language, parse_normalized
+
+
+def _number(text):
+    return int(text) if text.isdigit() else float(text)
+
+
+def legacy_parse(normalized_question):
+    """
+    parse_natural_language before the single-pass tokenizer, without its
+    error messages: one substring check and regex search per phrase
+    """
+    table_map = {
+        "air conditioners": "air_conditioners",
+        "appliances": "all_appliances",
+        "car and motorbike products": "all_car_and_motorbike_products",
+    }
+
+    table_name = None
+    predicates = []
+    sort = None
+    limit = None
+    group_by = None
+    aggregates = ()
+    joins = ()
+
+    for key, value in table_map.items():
+        if key in normalized_question.lower():
+            table_name = value
+            break
+    if not table_name:
+        raise ValueError("Could not identify the table from the question")
+
+    if "rating greater than" in normalized_question.lower():
+        match = re.search(r"rating greater than (\d+\.?\d*)", normalized_question.lower())
+        if match:
+            predicates.append(Predicate("numeric_rating", "gt", _number(match.group(1))))
+    if "comments greater than" in normalized_question.lower():
+        match = re.search(r"comments greater than (\d+)", normalized_question.lower())
+        if match:
+            predicates.append(Predicate("numeric_no_of_ratings", "gt", _number(match.group(1))))
+    if "price greater than" in normalized_question.lower():
+        match = re.search(r"price greater than (\d+)", normalized_question.lower())
+        if match:
+            predicates.append(Predicate("numeric_price", "gt", _number(match.group(1))))
+    if "price between" in normalized_question.lower():
+        match = re.search(r"price between (\d+) and (\d+)", normalized_question.lower())
+        if match:
+            predicates.append(Predicate("numeric_price", "between", (_number(match.group(1)), _number(match.group(2)))))
+
+    if "ascending price" in normalized_question.lower():
+        sort = Sort("numeric_price")
+    elif "descending price" in normalized_question.lower():
+        sort = Sort("numeric_price", descending=True)
+
+    if "group by category" in normalized_question.lower():
+        group_by = "sub_category"
+        aggregates = (AVG_RATING,) if "average rating" in normalized_question.lower() else (COUNT,)
+
+    join_keywords = {
+        "related to": "INNER JOIN",
+        "matching": "INNER JOIN",
+        "combined with": "INNER JOIN",
+        "including": "LEFT JOIN",
+        "along with": "LEFT JOIN",
+        "with all": "LEFT JOIN"
+    }
+    if "together with" in normalized_question.lower() and "connected to" in normalized_question.lower():
+        join_tables = [value for key, value in table_map.items()
+                       if key in normalized_question.lower() and value != table_name]
+        if len(join_tables) != 2:
+            raise ValueError("Invalid three-table join syntax")
+        joins = (
+            Join(join_tables[0], "INNER JOIN", "sub_category"),
+            Join(join_tables[1], "INNER JOIN", "main_category"),
+        )
+    else:
+        for keyword, join_operation in join_keywords.items():
+            if keyword in normalized_question.lower():
+                for key, value in table_map.items():
+                    if key in normalized_question.lower() and value != table_name:
+                        joins = (Join(value, join_operation, "sub_category"),)
+                        break
+                break
+
+    match = re.search(r"limit (\d+) records", normalized_question.lower())
+    if match:
+        limit = int(match.group(1))
+
+    return QueryPlan(table=table_name, predicates=tuple(predicates), sort=sort, limit=limit, group_by=group_by,
+                     aggregates=aggregates, joins=joins)
+
+
+def load_questions(path=os.path.join(BASE_DIR, "commands.txt")):
+    """Return the example questions from commands.txt"""
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip().lower().startswith("show ")]
+
+
+def time_per_call(func, questions, rounds):
+    """Mean seconds per call of func over every question, repeated `rounds` times"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for question in questions:
+            func(question)
+    return (time.perf_counter() - start) / (rounds * len(questions))
+
+
+def run(rounds=200):
+    questions = load_questions()
+    uncached = parse_normalized.__wrapped__
+    legacy_cached = lru_cache(maxsize=parse_normalized.cache_info().maxsize)(legacy_parse)
+
+    def parse_legacy(question):
+        return legacy_parse(normalize_command(question))
+
+    def parse_legacy_cached(question):
+        return legacy_cached(normalize_command(question))
+
+    def parse_uncached(question):
+        return uncached(normalize_command(question))
+
+    parse_normalized.cache_clear()
+    results = {
+        "questions": len(questions),
+        "legacy_us": time_per_call(parse_legacy, questions, rounds) * 1e6,
+        "legacy_cached_us": time_per_call(parse_legacy_cached, questions, rounds) * 1e6,
+        "uncached_us": time_per_call(parse_uncached, questions, rounds) * 1e6,
+        "cached_us": time_per_call(parse_natural_language, questions, rounds) * 1e6,
+    }
+    results["tokenizer_speedup"] = results["legacy_us"] / results["uncached_us"]
+    results["speedup"] = results["legacy_us"] / results["cached_us"]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=200, help="passes over the question set")
+    args = parser.parse_args()
+
+    results = run(args.rounds)
+    print(f"Questions:                 {results['questions']}")
+    print(f"Old parser, uncached:      {results['legacy_us']:.2f} us")
+    print(f"Old parser, cached:        {results['legacy_cached_us']:.2f} us")
+    print(f"Tokenizer, uncached:       {results['uncached_us']:.2f} us")
+    print(f"Tokenizer, cached:         {results['cached_us']:.2f} us")
+    print(f"Speedup of the tokenizer:  {results['tokenizer_speedup']:.1f}x")
+    print(f"Speedup, old to cached:    {results['speedup']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
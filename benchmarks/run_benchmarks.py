@@ -0,0 +1,200 @@
+"""
+Benchmark suite for the parse, import, query and render stages.
+
+Uses the CSVs in archive/ and runs fully offline by default: SQL stages
+run against an in-memory SQLite database and NoSQL stages against
+mongomock (skipped if mongomock is not installed). Pass --mysql or
+--mongo to measure the servers configured in main.py instead. The
+in-process NumPy engine is measured as the memory stages. Results are
+written as JSON for regression tracking.
+
+    python benchmarks/run_benchmarks.py --output bench_results.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from main import DATA_FOLDER, MONGO_CONNECTION_STRING, MONGO_DATABASE, SELECTED_FILES, SQL_CONFIG
+from nosql_handler import NoSQLDatabaseHandler
+from sql_handler import SQLDatabaseHandler
+from sqlite_handler import SQLiteDatabaseHandler
+from memory_handler import MemoryDatabaseHandler
+from utils import parse_natural_language
+
+import bench_parser
+from standins import mongomock_client
+
+# One question per query shape
+QUERY_SHAPES = {
+    "filter": "show me appliances with rating greater than 4 and comments greater than 1000",
+    "filter_limit": "show me appliances with rating greater than 4.5 limit 10 records",
+    "price_range": "show me appliances with price between 1000 and 5000",
+    "sort_limit": "show me appliances in ascending price limit 10 records",
+    "group_count": "show total number of appliances group by category",
+    "group_avg": "show average rating for appliances group by category",
+    "group_filtered": "show total number of appliances with rating greater than 4 group by category",
+    "group_multi": "show total number, average rating and price range of appliances group by category with totals",
+    "join_two_tables": "show me air conditioners related to appliances limit 10 records",
+    "join_three_tables": "show me air conditioners together with appliances connected to car and motorbike "
+                         "products limit 10 records",
+}
+
+# Shapes run as the parser plans them whose result is known to be empty: the
+# parser joins on sub_category, and no sub_category occurs in two of the
+# archive files. They are timed all the same and reported with "empty": true
+EMPTY_SHAPES = {"join_two_tables", "join_three_tables"}
+
+
+def quiet():
+    """Silence the progress output of the handlers"""
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def summarize(samples):
+    """Median, p95 and max of a list of seconds, in milliseconds"""
+    ordered = sorted(samples)
+    return {
+        "runs": len(ordered),
+        "median_ms": round(statistics.median(ordered) * 1000, 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def bench_import(import_func):
+    """Time one full import of SELECTED_FILES"""
+    start = time.perf_counter()
+    with quiet():
+        import_func(DATA_FOLDER, SELECTED_FILES)
+    elapsed = time.perf_counter() - start
+    return elapsed
+
+
+def bench_queries(handler, repeat):
+    """Latency of every query shape, executed `repeat` times without the result cache"""
+    results = {}
+    for shape, question in QUERY_SHAPES.items():
+        plan = parse_natural_language(question)
+        samples = []
+        rows = []
+        try:
+            for _ in range(repeat):
+                handler.result_cache.invalidate()
+                start = time.perf_counter()
+                rows = handler.execute_plan(plan)
+                samples.append(time.perf_counter() - start)
+        except NotImplementedError as e:
+            # mongomock lacks some pipeline stages, e.g. the pipeline form of $lookup
+            results[shape] = {"question": question, "skipped": str(e)}
+            continue
+        # An unexpectedly empty result would time a query that does no work
+        empty = shape in EMPTY_SHAPES
+        assert bool(rows) != empty, f"{shape} returned {len(rows)} rows: {question}"
+        results[shape] = {"question": question, "rows": len(rows), **summarize(samples)}
+        if plan.joins:
+            # Whether the join guard ran the plan as "count related" instead
+            with quiet():
+                guarded = handler.guard_join(plan) is not plan
+            results[shape].update(empty=empty, guarded=guarded)
+    return results
+
+
+def bench_render(handler, rows, repeat):
+    """Time format_value over the display fields of the given rows"""
+    fields = ["ratings", "no_of_ratings", "discount_price", "actual_price"]
+    values = [(row.get(field), field) for row in rows for field in fields]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for value, field in values:
+            handler.format_value(value, field)
+    elapsed = time.perf_counter() - start
+    calls = len(values) * repeat
+    return {"values": calls, "per_value_us": round(elapsed / calls * 1e6, 3) if calls else 0.0}
+
+
+def count_rows():
+    """Number of data rows in SELECTED_FILES"""
+    total = 0
+    for file in SELECTED_FILES:
+        with open(os.path.join(DATA_FOLDER, file), encoding="utf-8") as f:
+            total += sum(1 for _ in f) - 1
+    return total
+
+
+def run(args):
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "files": SELECTED_FILES,
+        "stages": {},
+    }
+    # Line count is an upper bound (quoted fields may span lines) but is stable across runs
+    source_rows = count_rows()
+
+    print("Parsing...", file=sys.stderr)
+    report["stages"]["parse"] = {
+        key: round(value, 3) if isinstance(value, float) else value
+        for key, value in bench_parser.run(args.parse_rounds).items()
+    }
+
+    backends = {}
+    if args.mysql:
+        backends["sql"] = ("mysql", SQLDatabaseHandler(**SQL_CONFIG, cache_size=0))
+    else:
+        backends["sql"] = ("sqlite", SQLiteDatabaseHandler(":memory:", cache_size=0))
+    if args.mongo:
+        backends["nosql"] = ("mongodb", NoSQLDatabaseHandler(MONGO_CONNECTION_STRING, MONGO_DATABASE, cache_size=0))
+    else:
+        client = mongomock_client()
+        if client is None:
+            print("mongomock is not installed; skipping NoSQL stages (use --mongo for a local mongod)", file=sys.stderr)
+        else:
+            backends["nosql"] = ("mongomock", NoSQLDatabaseHandler(None, MONGO_DATABASE, cache_size=0, client=client))
+    backends["memory"] = ("numpy", MemoryDatabaseHandler(DATA_FOLDER, SELECTED_FILES, cache_size=0))
+
+    for name, (engine, handler) in backends.items():
+        print(f"Benchmarking {name} ({engine})...", file=sys.stderr)
+        import_func = handler.import_data if name == "nosql" else handler.create_database_and_tables
+        elapsed = bench_import(import_func)
+        report["stages"][f"{name}_import"] = {
+            "engine": engine,
+            "rows": source_rows,
+            "seconds": round(elapsed, 3),
+            "rows_per_sec": round(source_rows / elapsed, 1),
+        }
+        report["stages"][f"{name}_query"] = {"engine": engine, "shapes": bench_queries(handler, args.repeat)}
+        rows = handler.execute_plan(parse_natural_language("show me appliances"))
+        report["stages"][f"{name}_render"] = bench_render(handler, rows, args.render_rounds)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the parse, import, query and render stages.")
+    parser.add_argument("--output", default="bench_results.json", help="JSON file for the results")
+    parser.add_argument("--repeat", type=int, default=20, help="executions per query shape")
+    parser.add_argument("--parse-rounds", type=int, default=200, help="passes over the parser question set")
+    parser.add_argument("--render-rounds", type=int, default=3, help="passes of format_value over the rows")
+    parser.add_argument("--mysql", action="store_true", help="use the MySQL server from main.SQL_CONFIG")
+    parser.add_argument("--mongo", action="store_true", help="use the MongoDB server from main.MONGO_CONNECTION_STRING")
+    args = parser.parse_args()
+
+    report = run(args)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report["stages"], indent=2))
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+"""
+Local stand-ins for the database servers, so benchmarks can run offline.
+
+The SQL stages use SQLiteDatabaseHandler with an in-memory database;
+mongomock, when installed, replaces the MongoDB client.
+"""
+
+
+def mongomock_client():
+    """Return a mongomock client, or None when mongomock is not installed"""
+    try:
+        import mongomock
+    except ImportError:
+        return None
+    return mongomock.MongoClient()
@@ -0,0 +1,241 @@
+"""
+On-disk columnar cache of the archive CSV files.
+
+The first load of a CSV parses it once and writes every column to a
+directory under `.column_cache/` next to the data folder:
+
+    <column>.npy          numeric columns (float64, or int64 for counts)
+    <column>.nulls.npy    missing-value mask of a column
+    <column>.heap         UTF-8 bytes of a text column, back to back
+    <column>.offsets.npy  start of each value in the heap (rows + 1 entries)
+    <column>.codes.npy    category codes; the distinct values live in meta.json
+    meta.json             source mtime, size and SHA-256, and the column list
+
+Later loads memory-map those files, so nothing is parsed or copied until a
+value is read. An entry is reused while the CSV's mtime and size are
+unchanged; otherwise the CSV is hashed and the entry rebuilt only if the
+content differs.
+"""
+import hashlib
+import json
+import mmap
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from csv_reader import read_frame
+from data_utils import INTEGER_COLUMNS, NUMERIC_COLUMNS
+
+# Bump when the file layout changes so that old entries are rebuilt
+CACHE_VERSION = 1
+CACHE_DIR_NAME = ".column_cache"
+
+# Text columns also stored as categorical codes
+CATEGORY_COLUMNS = ["main_category", "sub_category"]
+
+
+class StringHeap:
+    """Text column stored as one UTF-8 buffer plus offsets; None for missing values"""
+
+    def __init__(self, heap, offsets, nulls):
+        self.heap = heap
+        self.offsets = offsets
+        self.nulls = nulls
+
+    def __len__(self):
+        return len(self.nulls)
+
+    def take(self, indices):
+        """Decode the values at the given row indices"""
+        indices = np.asarray(indices, dtype=np.int64)
+        starts = self.offsets[indices].tolist()
+        ends = self.offsets[indices + 1].tolist()
+        nulls = self.nulls[indices].tolist()
+        heap = self.heap
+        return [None if null else heap[start:end].decode("utf-8") for start, end, null in zip(starts, ends, nulls)]
+
+    def to_list(self):
+        """Decode every value"""
+        return self.take(np.arange(len(self)))
+
+    @classmethod
+    def from_values(cls, values):
+        """Encode a sequence of str / missing values"""
+        nulls = pd.isna(values)
+        encoded = [b"" if null else str(value).encode("utf-8") for value, null in zip(values, nulls)]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return cls(b"".join(encoded), offsets, np.asarray(nulls, dtype=bool))
+
+
+class ColumnSet:
+    """Columns of one CSV file: text as StringHeap, numbers as arrays with null masks"""
+
+    def __init__(self, size, text_columns, strings, numeric, nulls, codes, categories):
+        self.size = size
+        self.text_columns = text_columns
+        self.strings = strings
+        self.numeric = numeric
+        self.nulls = nulls
+        self.codes = codes
+        self.categories = categories
+
+    @property
+    def columns(self):
+        """CSV columns followed by the numeric columns, as add_numeric_columns orders them"""
+        return self.text_columns + list(self.numeric)
+
+    @classmethod
+    def from_frame(cls, df):
+        """Build the columns of a DataFrame returned by read_frame"""
+        text_columns = [col for col in df.columns if col not in NUMERIC_COLUMNS.values()]
+        strings = {col: StringHeap.from_values(df[col].to_numpy(dtype=object)) for col in text_columns}
+        numeric = {}
+        nulls = {}
+        for col in df.columns:
+            if col in text_columns:
+                continue
+            nulls[col] = df[col].isna().to_numpy()
+            if col in INTEGER_COLUMNS:
+                numeric[col] = df[col].to_numpy(dtype=np.int64, na_value=0)
+            else:
+                numeric[col] = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        codes = {}
+        categories = {}
+        for col in CATEGORY_COLUMNS:
+            if col in text_columns:
+                codes[col], values = pd.factorize(df[col], use_na_sentinel=True)
+                categories[col] = np.asarray(values, dtype=object)
+        return cls(len(df), text_columns, strings, numeric, nulls, codes, categories)
+
+    def to_frame(self):
+        """Rebuild the DataFrame that read_frame returns, with plain text columns"""
+        df = pd.DataFrame({col: self.strings[col].to_list() for col in self.text_columns})
+        for col, values in self.numeric.items():
+            array_type = pd.arrays.IntegerArray if col in INTEGER_COLUMNS else pd.arrays.FloatingArray
+            df[col] = array_type(np.array(values), np.array(self.nulls[col]))
+        return df
+
+
+def cache_dir_for(file_path):
+    """Cache directory of a CSV file, under .column_cache/ next to its folder"""
+    folder = os.path.dirname(os.path.abspath(file_path))
+    stem = os.path.splitext(os.path.basename(file_path))[0].replace(" ", "_")
+    return os.path.join(os.path.dirname(folder), CACHE_DIR_NAME, stem)
+
+
+def file_hash(file_path):
+    """SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _map_file(path):
+    """Memory-map a file read-only; empty files give an empty buffer"""
+    if os.path.getsize(path) == 0:
+        return b""
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _write_entry(directory, columns, meta):
+    """Write a ColumnSet to a fresh directory and swap it in place of the old entry"""
+    staging = f"{directory}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    for col, heap in columns.strings.items():
+        with open(os.path.join(staging, f"{col}.heap"), "wb") as f:
+            f.write(heap.heap)
+        np.save(os.path.join(staging, f"{col}.offsets.npy"), heap.offsets)
+        np.save(os.path.join(staging, f"{col}.nulls.npy"), heap.nulls)
+    for col, values in columns.numeric.items():
+        np.save(os.path.join(staging, f"{col}.npy"), values)
+        np.save(os.path.join(staging, f"{col}.nulls.npy"), columns.nulls[col])
+    for col, codes in columns.codes.items():
+        np.save(os.path.join(staging, f"{col}.codes.npy"), codes)
+    # meta.json is written last: an entry without it is never read
+    with open(os.path.join(staging, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(staging, directory)
+
+
+def _read_entry(directory, meta):
+    """Memory-map the files of a cache entry"""
+    def array(name):
+        return np.load(os.path.join(directory, name), mmap_mode="r")
+
+    text_columns = meta["text_columns"]
+    strings = {
+        col: StringHeap(_map_file(os.path.join(directory, f"{col}.heap")),
+                        array(f"{col}.offsets.npy"), array(f"{col}.nulls.npy"))
+        for col in text_columns
+    }
+    numeric = {col: array(f"{col}.npy") for col in meta["numeric_columns"]}
+    nulls = {col: array(f"{col}.nulls.npy") for col in meta["numeric_columns"]}
+    codes = {col: array(f"{col}.codes.npy") for col in meta["categories"]}
+    categories = {col: np.asarray(values, dtype=object) for col, values in meta["categories"].items()}
+    return ColumnSet(meta["rows"], text_columns, strings, numeric, nulls, codes, categories)
+
+
+def _read_meta(directory):
+    try:
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("version") == CACHE_VERSION else None
+
+
+def load_columns(file_path):
+    """
+    Return the ColumnSet of a CSV file, from the cache when it is current.
+
+    If the cache cannot be written (e.g. a read-only checkout) the parsed
+    columns are returned from memory instead.
+    """
+    directory = cache_dir_for(file_path)
+    stat = os.stat(file_path)
+    meta = _read_meta(directory)
+    if meta and meta["mtime_ns"] == stat.st_mtime_ns and meta["size"] == stat.st_size:
+        return _read_entry(directory, meta)
+
+    digest = file_hash(file_path)
+    if meta and meta["sha256"] == digest:
+        # Touched but unchanged; remember the new mtime
+        meta["mtime_ns"] = stat.st_mtime_ns
+        meta["size"] = stat.st_size
+        try:
+            with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+        except OSError:
+            pass
+        return _read_entry(directory, meta)
+
+    columns = ColumnSet.from_frame(read_frame(file_path))
+    meta = {
+        "version": CACHE_VERSION,
+        "source": os.path.basename(file_path),
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "sha256": digest,
+        "rows": columns.size,
+        "text_columns": columns.text_columns,
+        "numeric_columns": list(columns.numeric),
+        "categories": {col: values.tolist() for col, values in columns.categories.items()},
+    }
+    try:
+        _write_entry(directory, columns, meta)
+    except OSError:
+        return columns
+    return _read_entry(directory, meta)
+
+
+def load_frame(file_path):
+    """DataFrame of a CSV file with its numeric columns, read through the cache"""
+    return load_columns(file_path).to_frame()
@@ -0,0 +1,147 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import errors
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of MySQL connections.
+
+    Connections are opened lazily up to `pool_size` and handed out with
+    `connection()`. A connection that has been idle for longer than
+    `health_check_interval` seconds is pinged (and reconnected if needed)
+    before it is reused; one that cannot be revived is replaced.
+    """
+
+    def __init__(self, pool_size=5, timeout=30, health_check_interval=30, **connect_args):
+        if pool_size < 1:
+            raise ValueError("pool_size must be at least 1")
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.connect_args = connect_args
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._active = 0
+        self._waits = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._checkouts = 0
+        self._replaced = 0
+
+    @contextmanager
+    def connection(self):
+        """Borrow a healthy connection and return it to the pool afterwards"""
+        connection = self._acquire()
+        try:
+            yield connection
+        except BaseException:
+            # Includes GeneratorExit when a streaming caller stops early
+            self._release(connection, rollback=True)
+            raise
+        else:
+            self._release(connection)
+
+    def _acquire(self):
+        start = time.perf_counter()
+        waited = False
+        while True:
+            try:
+                connection, idle_since = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_create = self._created < self.pool_size
+                    if can_create:
+                        self._created += 1
+                if can_create:
+                    try:
+                        connection = mysql.connector.connect(**self.connect_args)
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                    break
+                # Every connection is checked out; wait for one to come back
+                waited = True
+                remaining = self.timeout - (time.perf_counter() - start)
+                try:
+                    connection, idle_since = self._idle.get(timeout=max(remaining, 0))
+                except queue.Empty:
+                    raise errors.PoolError(f"No connection available within {self.timeout}s (pool size {self.pool_size})")
+
+            if time.perf_counter() - idle_since < self.health_check_interval or self._is_healthy(connection):
+                break
+            # The connection is dead; drop it and let the loop open a new one
+            self._discard(connection)
+            with self._lock:
+                self._replaced += 1
+
+        wait = time.perf_counter() - start
+        with self._lock:
+            self._active += 1
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+                self._total_wait += wait
+                self._max_wait = max(self._max_wait, wait)
+        return connection
+
+    def _release(self, connection, rollback=False):
+        with self._lock:
+            self._active -= 1
+        try:
+            if connection.unread_result:
+                connection.consume_results()
+            if rollback or connection.in_transaction:
+                connection.rollback()
+        except Exception:
+            # A connection in an unknown state is not reused
+            self._discard(connection)
+            return
+        self._idle.put((connection, time.perf_counter()))
+
+    def _is_healthy(self, connection):
+        try:
+            connection.ping(reconnect=True, attempts=1)
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, connection):
+        with self._lock:
+            self._created -= 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        """Return pool usage statistics"""
+        with self._lock:
+            return {
+                "pool_size": self.pool_size,
+                "open": self._created,
+                "active": self._active,
+                "idle": self._idle.qsize(),
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "total_wait_ms": round(self._total_wait * 1000, 2),
+                "avg_wait_ms": round(self._total_wait * 1000 / self._waits, 2) if self._waits else 0.0,
+                "max_wait_ms": round(self._max_wait * 1000, 2),
+                "replaced": self._replaced,
+            }
+
+    def close(self):
+        """Close every idle connection"""
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(connection)
@@ -0,0 +1,155 @@
+"""
+Streaming reader of the archive CSV files, shared by the importers.
+
+Every file is read with declared dtypes, so pandas never infers column
+types; main_category and sub_category are read as categoricals. The
+image and link columns can be skipped at parse time. Files are read in
+chunks of a fixed number of rows, including the pass that finds the
+longest value of each column, used to size SQL columns.
+
+For incremental syncs the reader can also tag every row with a stable
+key, derived from the product link, and a hash of its CSV values.
+"""
+import hashlib
+import time
+from collections import defaultdict
+
+import pandas as pd
+
+from data_utils import NUMERIC_COLUMNS, add_numeric_columns
+
+# Declared pandas dtypes of the archive CSV columns; unknown columns are read as text
+CSV_DTYPES = {
+    "name": str,
+    "main_category": "category",
+    "sub_category": "category",
+    "image": str,
+    "link": str,
+    "ratings": str,
+    "no_of_ratings": str,
+    "discount_price": str,
+    "actual_price": str,
+}
+
+# Columns no query reads, which importers may skip
+LINK_COLUMNS = ("image", "link")
+
+# Column identifying a product across imports, and the columns add_row_keys adds
+KEY_COLUMN = "link"
+ROW_KEY_COLUMNS = ["row_key", "row_hash"]
+
+# Rows per chunk when streaming a file
+CHUNK_ROWS = 5000
+
+
+def _read_options(drop_columns):
+    dropped = set(drop_columns)
+    return {
+        "dtype": defaultdict(lambda: str, CSV_DTYPES),
+        "usecols": lambda column: column not in dropped,
+    }
+
+
+def max_lengths(df, columns):
+    """Longest text of each of `columns` in a DataFrame; missing values count as empty"""
+    return {col: int(df[col].astype(object).fillna("").astype(str).str.len().max()) if len(df) else 0
+            for col in columns}
+
+
+def add_row_keys(df, seen=None):
+    """
+    Add row_key, the SHA-1 of the product link (or of the row's values when
+    it has none), and row_hash, a hash of the CSV values that changes
+    whenever the row does. Keys already in `seen` get a numeric suffix so
+    that they stay unique within a file; `seen` is updated in place.
+    """
+    csv_columns = [col for col in df.columns if col not in NUMERIC_COLUMNS.values() and col not in ROW_KEY_COLUMNS]
+    # Text hashes do not depend on whether a column was read as categorical
+    hashes = pd.util.hash_pandas_object(df[csv_columns].astype(object), index=False)
+    row_hashes = [f"{value:016x}" for value in hashes.to_numpy()]
+    links = df[KEY_COLUMN].astype(object).where(pd.notna(df[KEY_COLUMN]), None) if KEY_COLUMN in df.columns \
+        else [None] * len(df)
+    seen = set() if seen is None else seen
+    keys = []
+    for link, row_hash in zip(links, row_hashes):
+        key = hashlib.sha1(link.encode("utf-8")).hexdigest() if link else f"row-{row_hash}"
+        if key in seen:
+            suffix = 2
+            while f"{key}-{suffix}" in seen:
+                suffix += 1
+            key = f"{key}-{suffix}"
+        seen.add(key)
+        keys.append(key)
+    df["row_key"] = keys
+    df["row_hash"] = row_hashes
+    return df
+
+
+class CSVReader:
+    """
+    Reads one CSV file in chunks of at most `chunk_rows` rows, each with
+    the numeric columns (and, with `row_keys=True`, the add_row_keys
+    columns) added. Iterating counts the rows read and the seconds spent
+    parsing them.
+
+    `start_row` skips that many data rows, e.g. to resume an import;
+    `seen_keys` are the row keys those rows already took.
+    """
+
+    def __init__(self, file_path, chunk_rows=CHUNK_ROWS, drop_columns=(), row_keys=False, start_row=0,
+                 seen_keys=()):
+        self.file_path = file_path
+        self.chunk_rows = chunk_rows
+        self.drop_columns = tuple(drop_columns)
+        self.row_keys = row_keys
+        self.start_row = start_row
+        self.seen_keys = seen_keys
+        self.rows = 0
+        self.read_seconds = 0.0
+
+    def header(self):
+        """Every column of the file, in file order"""
+        return list(pd.read_csv(self.file_path, nrows=0).columns)
+
+    def columns(self):
+        """Columns read from the file, in file order"""
+        return [col for col in self.header() if col not in self.drop_columns]
+
+    def output_columns(self):
+        """Columns of every chunk: the file's, then the numeric ones, then the row keys"""
+        columns = self.columns()
+        numeric_columns = [numeric for col, numeric in NUMERIC_COLUMNS.items() if col in columns]
+        return columns + numeric_columns + (ROW_KEY_COLUMNS if self.row_keys else [])
+
+    def max_lengths(self):
+        """Longest value of each column read, over the whole file, one chunk at a time"""
+        columns = self.columns()
+        lengths = dict.fromkeys(columns, 0)
+        with pd.read_csv(self.file_path, chunksize=self.chunk_rows, **_read_options(self.drop_columns)) as chunks:
+            for chunk in chunks:
+                for col, length in max_lengths(chunk, columns).items():
+                    lengths[col] = max(lengths[col], length)
+        return lengths
+
+    def __iter__(self):
+        start = time.perf_counter()
+        # Row keys and hashes cover every column, including dropped ones
+        read_dropped = () if self.row_keys else self.drop_columns
+        seen = set(self.seen_keys)
+        # Line 0 is the header
+        skiprows = range(1, self.start_row + 1) if self.start_row else None
+        with pd.read_csv(self.file_path, chunksize=self.chunk_rows, skiprows=skiprows,
+                         **_read_options(read_dropped)) as chunks:
+            for chunk in chunks:
+                chunk = add_numeric_columns(chunk)
+                if self.row_keys:
+                    chunk = add_row_keys(chunk, seen).drop(columns=list(self.drop_columns), errors="ignore")
+                self.rows += len(chunk)
+                self.read_seconds += time.perf_counter() - start
+                yield chunk
+                start = time.perf_counter()
+
+
+def read_frame(file_path, drop_columns=()):
+    """The whole CSV file as one DataFrame with the numeric columns added"""
+    return add_numeric_columns(pd.read_csv(file_path, **_read_options(drop_columns)))
@@ -0,0 +1,30 @@
+import pandas as pd
+
+# Display column -> numeric column stored alongside it at import time
+NUMERIC_COLUMNS = {
+    "ratings": "numeric_rating",
+    "no_of_ratings": "numeric_no_of_ratings",
+    "discount_price": "numeric_price",
+    "actual_price": "numeric_actual_price",
+}
+
+# Numeric columns that hold whole numbers
+INTEGER_COLUMNS = {"numeric_no_of_ratings"}
+
+
+def parse_numeric(series, integer=False):
+    """Convert display strings such as '₹1,245' or '2,255' to numbers; anything else becomes NaN"""
+    cleaned = series.astype("string").str.replace(r"[₹,]", "", regex=True).str.strip()
+    values = pd.to_numeric(cleaned, errors="coerce")
+    if integer:
+        # Review counts must be whole numbers, e.g. '4.5' in the wrong column is rejected
+        return values.where(values == values.round()).astype("Int64")
+    return values.astype("Float64")
+
+
+def add_numeric_columns(df):
+    """Add the numeric_* columns for every display column present in the DataFrame"""
+    for column, numeric_column in NUMERIC_COLUMNS.items():
+        if column in df.columns:
+            df[numeric_column] = parse_numeric(df[column], integer=numeric_column in INTEGER_COLUMNS)
+    return df
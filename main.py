@@ -1,4 +1,6 @@
 from sql_handler import SQLDatabaseHandler
+from sqlite_handler import SQLiteDatabaseHandler
+from memory_handler import MemoryDatabaseHandler
 from nosql_handler import NoSQLDatabaseHandler
 from utils import parse_natural_language
 from console_utils import ConsoleFormatter as cf
@@ -19,6 +21,11 @@ SQL_CONFIG = {
 }
 MONGO_CONNECTION_STRING = "mongodb://localhost:27017/"
 MONGO_DATABASE = "selected_data"
+# Parallelism of the imports (1 = one after another): CSVs parsed and tables
+# loaded at once by the SQL import, insert threads of the NoSQL import
+IMPORT_WORKERS = min(4, os.cpu_count() or 1)
+# Embedded database file, built from DATA_FOLDER on first use
+SQLITE_PATH = os.path.join(BASE_DIR, "selected_data.sqlite")
 
 SELECTED_FILES = [
     "Air Conditioners.csv",
@@ -34,6 +41,8 @@ def print_welcome():
     print(cf.info("Select your database:"))
     print("1. " + cf.success("SQL    - Full features with price analysis"))
     print("2. " + cf.success("NoSQL  - Fast queries for ratings and reviews"))
+    print("3. " + cf.success("SQLite - SQL features without a database server"))
+    print("4. " + cf.success("Memory - In-process engine over the CSV files"))
     print("="*60)
 
 def print_help(db_type):
@@ -51,7 +60,7 @@ def print_help(db_type):
     print("   • car and motorbike products")
     
     # Database specific features
-    if db_type == "sql":
+    if db_type in ["sql", "sqlite", "memory"]:
         print(cf.info("\n💡 Available Conditions:"))
         print("   • with rating greater than X")
         print("   • with comments greater than X")
@@ -71,6 +80,7 @@ def print_help(db_type):
         print("\n   2. Rating Analysis:")
         print("      show me appliances with rating greater than 4.5 limit 10 records")
         print("      show average rating for air conditioners group by category")
+        print("      show total number of appliances group by main category")
         
         print("\n   3. Comments Analysis:")
         print("      show me air conditioners with comments greater than 2000 limit 10 records")
@@ -82,6 +92,9 @@ def print_help(db_type):
         print("      show me appliances related to air conditioners with comments greater than 1000")
         print("      # Three-table joins")
         print("      show me appliances together with air conditioners connected to car and motorbike products")
+        print("      # Rows that have related rows, or how many")
+        print("      show me air conditioners having related appliances")
+        print("      show me appliances together with air conditioners connected to car and motorbike products count related")
         
         print("\n   5. Join with Conditions:")
         print("      show me appliances including air conditioners with rating greater than 4.5")
@@ -90,6 +103,7 @@ def print_help(db_type):
         print("\n   6. Advanced Statistics:")
         print("      show average rating for appliances group by category")
         print("      show total number of air conditioners with rating greater than 4 group by category")
+        print("      show total number, average rating and price range of appliances group by category with totals")
         
         print("\n   7. Combined Conditions:")
         print("      show me appliances with rating greater than 4.2 and comments greater than 3000")
@@ -106,6 +120,7 @@ def print_help(db_type):
         
         print(cf.info("\n📊 Group By Options:"))
         print("   • show total number of [category] group by category")
+        print("   • show total number of [category] group by main category")
         print("   • show total number of [category] with rating greater than X group by category")
         print("   • show total number of [category] with comments greater than X group by category")
         
@@ -117,6 +132,7 @@ def print_help(db_type):
         print("\n   2. Rating Analysis:")
         print("      show me appliances with rating greater than 4.5 limit 10 records")
         print("      show average rating for air conditioners group by category")
+        print("      show total number of appliances group by main category")
         
         print("\n   3. Comments Analysis:")
         print("      show me air conditioners with comments greater than 2000 limit 10 records")
@@ -136,6 +152,7 @@ def print_help(db_type):
         print("\n   6. Advanced Statistics:")
         print("      show average rating for appliances group by category")
         print("      show total number of air conditioners with rating greater than 4 group by category")
+        print("      show total number, average rating and price range of appliances group by category with totals")
         
         print("\n   7. Combined Conditions:")
         print("      show me appliances with rating greater than 4.2 and comments greater than 3000")
@@ -148,11 +165,37 @@ def print_help(db_type):
 
     print(cf.info("\n⌨️  Special Commands:"))
     print("   • help  - Show this guide")
+    print("   • stats - Show connection and runtime statistics")
     print("   • exit  - Return to database selection")
     print("="*60)
 
-def initialize_database(db_type):
-    """Initialize database and import data"""
+def print_stats(handler):
+    """Display runtime statistics reported by the handler"""
+    if not hasattr(handler, "get_stats"):
+        print(cf.warning("No statistics available for this database."))
+        return
+    print("\n" + cf.header("Statistics"))
+    for section, values in handler.get_stats().items():
+        print(cf.info(f"\n{section.replace('_', ' ').title()}:"))
+        for key, value in values.items():
+            print(f"   • {key}: {value}")
+
+def create_handler(db_type, workers=None):
+    """
+    Connect to the selected database without importing data; with
+    `workers`, the SQL connection pool is sized for that many concurrent queries
+    """
+    if db_type == "sql":
+        pool_options = {} if workers is None else {"pool_size": max(workers, 1)}
+        return SQLDatabaseHandler(**SQL_CONFIG, **pool_options)
+    if db_type == "sqlite":
+        return SQLiteDatabaseHandler(SQLITE_PATH, DATA_FOLDER, SELECTED_FILES)
+    if db_type == "memory":
+        return MemoryDatabaseHandler(DATA_FOLDER, SELECTED_FILES)
+    return NoSQLDatabaseHandler(MONGO_CONNECTION_STRING, MONGO_DATABASE)
+
+def initialize_database(db_type, incremental=False):
+    """Initialize database and import data, or with `incremental` apply only the rows that changed"""
     print(cf.header("\n🔄 Database Initialization"))
     
     if not os.path.exists(DATA_FOLDER):
@@ -163,13 +206,26 @@ def initialize_database(db_type):
         if not os.path.exists(file_path):
             raise FileNotFoundError(cf.error(f"❌ Data file not found: {file_path}"))
 
-    print(cf.info("📥 Importing data..."))
+    print(cf.info("🔁 Syncing changed data..." if incremental else "📥 Importing data..."))
     if db_type == "sql":
         handler = SQLDatabaseHandler(**SQL_CONFIG)
+        if incremental:
+            handler.sync_tables(DATA_FOLDER, SELECTED_FILES)
+        else:
+            handler.create_database_and_tables(DATA_FOLDER, SELECTED_FILES, workers=IMPORT_WORKERS)
+    elif db_type == "sqlite" and incremental:
+        handler = create_handler(db_type)
+        handler.sync_tables(DATA_FOLDER, SELECTED_FILES)
+    elif db_type in ["sqlite", "memory"]:
+        # The memory engine always reloads; the column cache already skips unchanged files
+        handler = create_handler(db_type)
         handler.create_database_and_tables(DATA_FOLDER, SELECTED_FILES)
     else:
         handler = NoSQLDatabaseHandler(MONGO_CONNECTION_STRING, MONGO_DATABASE)
-        handler.import_data(DATA_FOLDER, SELECTED_FILES)
+        if incremental:
+            handler.sync_data(DATA_FOLDER, SELECTED_FILES)
+        else:
+            handler.import_data(DATA_FOLDER, SELECTED_FILES, workers=IMPORT_WORKERS)
     
     print(cf.success("\n✅ Database initialization completed!"))
     return handler
@@ -178,76 +234,56 @@ def main():
     print_welcome()
     
     while True:
-        db_type = input("\n" + cf.info("👉 Choose database (SQL/NoSQL/exit): ")).strip().lower()
+        db_type = input("\n" + cf.info("👉 Choose database (SQL/NoSQL/SQLite/Memory/exit): ")).strip().lower()
         if db_type == "exit":
             print(cf.success("\n👋 Thank you for using our system. Goodbye!"))
             break
-        if db_type not in ["sql", "nosql"]:
-            print(cf.error("❌ Invalid choice. Please enter 'SQL' or 'NoSQL'."))
+        if db_type not in ["sql", "nosql", "sqlite", "memory"]:
+            print(cf.error("❌ Invalid choice. Please enter 'SQL', 'NoSQL', 'SQLite' or 'Memory'."))
             continue
 
         print(cf.highlight(f"\n🔄 Selected {db_type.upper()} database"))
         
-        init_db = input(cf.info("📥 Initialize database? (yes/no): ")).strip().lower()
-        if init_db == "yes":
+        init_db = input(cf.info("📥 Initialize database? (yes/no/sync): ")).strip().lower()
+        if init_db in ["yes", "sync"]:
             try:
-                handler = initialize_database(db_type)
+                handler = initialize_database(db_type, incremental=init_db == "sync")
             except Exception as e:
                 print(cf.error(f"❌ Initialization failed: {e}"))
                 continue
         else:
-            if db_type == "sql":
-                handler = SQLDatabaseHandler(**SQL_CONFIG)
-            else:
-                handler = NoSQLDatabaseHandler(MONGO_CONNECTION_STRING, MONGO_DATABASE)
+            handler = create_handler(db_type)
 
         print(cf.success("\n✅ Connected successfully!"))
         print_help(db_type)
 
         while True:
             try:
-                question = input("\n" + cf.info("🔍 Enter query (help/exit): ")).strip()
+                question = input("\n" + cf.info("🔍 Enter query (help/stats/exit): ")).strip()
                 if question.lower() == "exit":
                     print(cf.success("👈 Returning to database selection..."))
                     break
                 elif question.lower() == "help":
                     print_help(db_type)
                     continue
+                elif question.lower() == "stats":
+                    print_stats(handler)
+                    continue
 
-                if db_type == "sql":
-                    table_name, condition, order_by, limit, group_by, aggregate, join_table, join_type, join_condition = parse_natural_language(question, db_type)
-                    result = handler.query(
-                        table_name=table_name,
-                        condition=condition,
-                        order_by=order_by,
-                        limit=limit,
-                        group_by=group_by,
-                        aggregate=aggregate,
-                        join_table=join_table,
-                        join_type=join_type,
-                        join_condition=join_condition
-                    )
-                    
-                    if result == "modify":
-                        continue  # Let the user enter a revised query
-                    elif result == "similar":
-                        continue  # Ask the user to enter a query similar to
-                    elif result == "new":
-                        continue  # Let the user enter a new query
-                    elif result == "exit":
-                        break    # back to main menu
-                    elif result == "error":
-                        print(cf.error("Query execution failed. Please try again."))
-                        continue
-                else:
-                    table_name, condition, order_by, limit, group_by, aggregate, _, _, _ = parse_natural_language(question, db_type)
-                    handler.query(
-                        collection_name=table_name,
-                        condition=condition,
-                        limit=limit,
-                        group_by=group_by,
-                        aggregate=aggregate
-                    )
+                plan = parse_natural_language(question)
+                result = handler.query(plan)
+                
+                if result == "modify":
+                    continue  # Let the user enter a revised query
+                elif result == "similar":
+                    continue  # Ask the user to enter a query similar to
+                elif result == "new":
+                    continue  # Let the user enter a new query
+                elif result == "exit":
+                    break    # back to main menu
+                elif result == "error":
+                    print(cf.error("Query execution failed. Please try again."))
+                    continue
 
             except ValueError as e:
                 print(cf.error(f"Error parsing query: {e}"))
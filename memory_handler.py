@@ -0,0 +1,405 @@
+import os
+import threading
+import time
+import numpy as np
+from column_cache import load_columns
+from console_utils import ConsoleFormatter as cf
+from data_utils import INTEGER_COLUMNS
+from query_plan import JOIN_COLUMNS, MAX_JOIN_ROWS
+from result_cache import ResultCache
+from sql_handler import FETCH_SIZE, SQLDatabaseHandler
+
+class ColumnTable:
+    """
+    One dataset held as NumPy column arrays.
+
+    The arrays come from the column cache and are usually memory-mapped:
+    float64 prices and ratings (NaN for missing values), int64 review
+    counts with a null mask, integer codes for the category columns and
+    text columns that are only decoded for the rows being returned.
+    """
+
+    def __init__(self, name, column_set):
+        self.name = name
+        self.size = column_set.size
+        self.columns = ["id"] + column_set.columns
+        self.numeric = column_set.numeric
+        self.nulls = column_set.nulls
+        self.codes = column_set.codes
+        self.categories = column_set.categories
+        self.strings = column_set.strings
+        self._groups = {}
+
+    def grouped_rows(self, column):
+        """
+        Row indices ordered by the category code of `column`, the number of
+        rows per code and where each code's run starts in that order.
+        """
+        if column not in self._groups:
+            codes = self.codes[column]
+            order = np.argsort(codes, kind="stable")
+            sizes = np.bincount(codes[codes >= 0], minlength=len(self.categories[column]))
+            starts = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64) + np.count_nonzero(codes < 0)
+            self._groups[column] = (order, sizes, starts)
+        return self._groups[column]
+
+    def column_values(self, column, indices):
+        """Values of one column for the given row indices as a list; index -1 gives None"""
+        missing = indices < 0
+        indices = np.where(missing, 0, indices)
+        if column == "id":
+            # Same ids as the SQL tables' AUTO_INCREMENT key
+            values = (indices + 1).tolist()
+        elif column in self.numeric:
+            values = self.numeric[column][indices].tolist()
+            missing = missing | self.nulls[column][indices]
+        else:
+            values = self.strings[column].take(indices)
+        for position in np.flatnonzero(missing):
+            values[position] = None
+        return values
+
+    def rows(self, indices, columns):
+        """Build result dictionaries with the given columns for the given row indices"""
+        values = [self.column_values(column, indices) for column in columns]
+        return [dict(zip(columns, row)) for row in zip(*values)]
+
+
+def load_table(file_path, table_name):
+    """Load one CSV into a ColumnTable through the column cache"""
+    return ColumnTable(table_name, load_columns(file_path))
+
+
+class MemoryDatabaseHandler(SQLDatabaseHandler):
+    """
+    In-process query engine over NumPy column arrays.
+
+    Plans are executed as vectorized filters, sorts and group-bys on the
+    loaded columns, with no database server involved. It shares the SQL
+    handler's interactive flow and result shapes, and shows the equivalent
+    SQL for each plan.
+    """
+
+    def __init__(self, folder_path, selected_files, cache_size=256, cache_ttl=300, max_join_rows=MAX_JOIN_ROWS):
+        self.database = "memory"
+        self.folder_path = folder_path
+        self.selected_files = selected_files
+        self.tables = {}
+        self.load_seconds = 0.0
+        self.load_lock = threading.Lock()
+        self.result_cache = ResultCache(max_entries=cache_size, ttl=cache_ttl)
+        self.max_join_rows = max_join_rows
+
+    def get_stats(self):
+        """Return runtime statistics of this handler"""
+        return {
+            "memory_engine": {
+                "tables": len(self.tables),
+                "rows": sum(table.size for table in self.tables.values()),
+                "load_seconds": round(self.load_seconds, 3),
+            },
+            "result_cache": self.result_cache.stats(),
+        }
+
+    def close(self):
+        """Release the loaded columns"""
+        self.tables.clear()
+
+    def table_name(self, file):
+        """Table name used for a CSV file"""
+        return file.replace(" ", "_").replace(".csv", "").lower()
+
+    def create_database_and_tables(self, folder_path, selected_files):
+        """Load the selected CSV files into column arrays"""
+        print(cf.header("DATABASE IMPORT PROCESS"))
+        start = time.perf_counter()
+        for file in selected_files:
+            table_name = self.table_name(file)
+            table = load_table(os.path.join(folder_path, file), table_name)
+            self.tables[table_name] = table
+            self.result_cache.invalidate(table_name)
+            print(f"{cf.info('Loaded table:')} {cf.highlight(table_name)} ({table.size} records)")
+        self.load_seconds = time.perf_counter() - start
+        self.folder_path = folder_path
+        self.selected_files = selected_files
+        print(cf.success(f"Loaded {len(selected_files)} tables in {self.load_seconds:.2f}s"))
+
+    def summary_current(self, table_name):
+        """There are no summary tables; group-bys run on the column arrays"""
+        return False
+
+    def get_table(self, table_name):
+        """Return a loaded table, loading the CSV files on first use"""
+        with self.load_lock:
+            if not self.tables:
+                self.create_database_and_tables(self.folder_path, self.selected_files)
+        if table_name not in self.tables:
+            raise ValueError(f"Unknown table: {table_name}")
+        return self.tables[table_name]
+
+    def category_counts(self, table_name, columns, predicates=()):
+        """Number of rows of a table per combination of values of `columns`"""
+        table = self.get_table(table_name)
+        mask = self.filter_mask(table, predicates)
+        # One integer per combination of codes (mixed radix), counted with bincount
+        sizes = [len(table.categories[column]) for column in columns]
+        keys = np.zeros(np.count_nonzero(mask), dtype=np.int64)
+        valid = np.ones(len(keys), dtype=bool)
+        for column, size in zip(columns, sizes):
+            codes = table.codes[column][mask]
+            valid &= codes >= 0
+            keys = keys * size + codes
+        counts = np.bincount(keys[valid], minlength=int(np.prod(sizes)))
+        result = {}
+        for key in np.flatnonzero(counts).tolist():
+            values = []
+            remainder = key
+            for column, size in zip(reversed(columns), reversed(sizes)):
+                remainder, code = divmod(remainder, size)
+                values.append(table.categories[column][code])
+            result[tuple(reversed(values))] = int(counts[key])
+        return result
+
+    def filter_mask(self, table, predicates):
+        """Boolean mask of the rows that satisfy every predicate"""
+        mask = np.ones(table.size, dtype=bool)
+        for predicate in predicates:
+            values = table.numeric[predicate.field]
+            if predicate.op == "between":
+                low, high = predicate.value
+                mask &= (values >= low) & (values <= high)
+            elif predicate.op == "gt":
+                mask &= values > predicate.value
+            else:
+                raise ValueError(f"Unsupported predicate operator: {predicate.op}")
+            # Missing values never match, as with SQL NULLs
+            mask &= ~table.nulls[predicate.field]
+        return mask
+
+    def sort_indices(self, table, indices, sort):
+        """Order row indices like SQL ORDER BY: NULLs first ascending, last descending"""
+        values = table.numeric[sort.field][indices]
+        nulls = table.nulls[sort.field][indices]
+        present = indices[~nulls]
+        keys = values[~nulls]
+        order = np.argsort(-keys if sort.descending else keys, kind="stable")
+        if sort.descending:
+            return np.concatenate([present[order], indices[nulls]])
+        return np.concatenate([indices[nulls], present[order]])
+
+    def execute_group(self, table, plan, mask):
+        """Vectorized GROUP BY computing every aggregate in one pass over the selected rows"""
+        codes = table.codes[plan.group_by][mask]
+        categories = table.categories[plan.group_by]
+        valid = codes >= 0
+        counts = np.bincount(codes[valid], minlength=len(categories))
+
+        columns = {}
+        totals = {}
+        for aggregate in plan.aggregates:
+            if aggregate.func == "count":
+                columns[aggregate.alias] = counts
+                totals[aggregate.alias] = int(mask.sum())
+                continue
+            values = table.numeric[aggregate.field][mask]
+            present = ~table.nulls[aggregate.field][mask]
+            group_present = present & valid
+            group_codes, group_values = codes[group_present], values[group_present]
+            present_counts = np.bincount(group_codes, minlength=len(categories))
+            if aggregate.func in ("avg", "sum"):
+                sums = np.bincount(group_codes, weights=group_values, minlength=len(categories))
+                if aggregate.func == "sum":
+                    column = sums
+                else:
+                    with np.errstate(invalid="ignore", divide="ignore"):
+                        column = sums / np.maximum(present_counts, 1)
+            elif aggregate.func in ("min", "max"):
+                reduce = np.minimum if aggregate.func == "min" else np.maximum
+                column = np.full(len(categories), np.inf if aggregate.func == "min" else -np.inf)
+                reduce.at(column, group_codes, group_values)
+            else:
+                raise ValueError(f"Unsupported aggregate: {aggregate.func}")
+            # Groups without a value give NULL, as in SQL
+            columns[aggregate.alias] = np.where(present_counts > 0, column, np.nan)
+            selected = values[present]
+            if not len(selected):
+                totals[aggregate.alias] = None
+            elif aggregate.func == "avg":
+                totals[aggregate.alias] = float(selected.mean())
+            elif aggregate.func == "sum":
+                totals[aggregate.alias] = selected.sum().item()
+            else:
+                totals[aggregate.alias] = float(selected.min() if aggregate.func == "min" else selected.max())
+
+        groups = np.flatnonzero(counts)
+        first = columns[plan.aggregates[0].alias][groups].astype(np.float64)
+        # ORDER BY the first aggregate DESC; groups without a value go last
+        order = np.lexsort((-np.nan_to_num(first, nan=0.0), np.isnan(first)))
+        results = []
+        for group in groups[order]:
+            row = {plan.group_by: categories[group]}
+            for aggregate in plan.aggregates:
+                value = columns[aggregate.alias][group]
+                if aggregate.func == "count":
+                    row[aggregate.alias] = int(value)
+                elif np.isnan(value):
+                    row[aggregate.alias] = None
+                elif aggregate.func == "sum" and aggregate.field in INTEGER_COLUMNS:
+                    row[aggregate.alias] = int(value)
+                else:
+                    row[aggregate.alias] = float(value)
+            if plan.totals:
+                row["is_total"] = 0
+            results.append(row)
+        if plan.totals:
+            results.append({plan.group_by: None, **totals, "is_total": 1})
+        return results
+
+    def related_codes(self, left, left_indices, right, join):
+        """
+        Codes of the left rows' join values in the right table (-1 if the
+        value does not occur there) and the number of right rows per code.
+        """
+        # Translate the left table's category codes into the right table's codes
+        lookup = {value: code for code, value in enumerate(right.categories[join.on])}
+        translate = np.array([lookup.get(value, -1) for value in left.categories[join.on]] + [-1], dtype=np.int64)
+        codes = translate[left.codes[join.on][left_indices]]
+        _, sizes, _ = right.grouped_rows(join.on)
+        return codes, sizes
+
+    def related_counts(self, left, left_indices, right, join):
+        """Number of rows of `right` related to each of the left rows"""
+        codes, sizes = self.related_codes(left, left_indices, right, join)
+        if not len(sizes):
+            return np.zeros(len(left_indices), dtype=np.int64)
+        return np.where(codes >= 0, sizes[np.maximum(codes, 0)], 0)
+
+    def join_indices(self, left, left_indices, right, join):
+        """
+        Hash join of the left rows with `right` on a category column.
+
+        Returns, per output row, the position in `left_indices` and the
+        matching right row index; a left row without a match gets right
+        index -1 for a LEFT JOIN and is dropped for an INNER JOIN.
+        """
+        codes, _ = self.related_codes(left, left_indices, right, join)
+        matches = self.related_counts(left, left_indices, right, join)
+        # Right rows of code c are order[starts[c]:starts[c] + sizes[c]]
+        order, _, starts = right.grouped_rows(join.on)
+
+        repeats = np.maximum(matches, 1) if join.join_type == "LEFT JOIN" else matches
+        positions = np.repeat(np.arange(len(left_indices)), repeats)
+        # Offset of each output row within the run of matches of its left row
+        offsets = np.arange(len(positions)) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+        has_match = matches[positions] > 0
+        pair_right = np.full(len(positions), -1, dtype=np.int64)
+        pair_right[has_match] = order[starts[codes[positions[has_match]]] + offsets[has_match]]
+        return positions, pair_right
+
+    def execute_related(self, table, plan, mask):
+        """Semi-join or count related: one row per matching row of the plan's table"""
+        indices = np.flatnonzero(mask)
+        counts = [self.related_counts(table, indices, self.get_table(join.table), join) for join in plan.joins]
+        keep = np.ones(len(indices), dtype=bool)
+        for join, related in zip(plan.joins, counts):
+            if plan.join_mode == "semi" or join.join_type == "INNER JOIN":
+                keep &= related > 0
+        indices = indices[keep]
+        counts = [related[keep] for related in counts]
+        if plan.limit:
+            indices = indices[:plan.limit]
+            counts = [related[:plan.limit] for related in counts]
+
+        columns = [(f"{table.name}_id", table.column_values("id", indices))]
+        columns.extend((column, table.column_values(column, indices)) for column in JOIN_COLUMNS)
+        columns.append(("category", table.column_values("sub_category", indices)))
+        if plan.join_mode == "count":
+            columns.extend((f"{join.table}_count", related.tolist()) for join, related in zip(plan.joins, counts))
+        names = [name for name, _ in columns]
+        return [dict(zip(names, row)) for row in zip(*(values for _, values in columns))]
+
+    def execute_join(self, table, plan, mask):
+        """
+        Run a two- or three-table join, FETCH_SIZE rows of the plan's table
+        at a time, and stop as soon as the limit is reached.
+        """
+        indices = np.flatnonzero(mask)
+        remaining = plan.limit
+        for start in range(0, len(indices), FETCH_SIZE):
+            rows = self.join_rows(table, plan, indices[start:start + FETCH_SIZE], remaining)
+            if remaining is not None:
+                remaining -= len(rows)
+            yield from rows
+            if remaining == 0:
+                break
+
+    def join_rows(self, table, plan, indices, limit=None):
+        """
+        Joined rows for some rows of the plan's table, at most `limit` of
+        them; every join key is a column of that table.
+        """
+        pairs = {"t1": indices}
+        sources = {}
+        for number, join in enumerate(plan.joins, 2):
+            right = self.get_table(join.table)
+            positions, pair_right = self.join_indices(table, pairs["t1"], right, join)
+            if limit is not None and all(later.join_type == "LEFT JOIN" for later in plan.joins[number - 1:]):
+                # No later join can drop rows, so only the first `limit` pairs are needed
+                positions, pair_right = positions[:limit], pair_right[:limit]
+            pairs = {alias: rows[positions] for alias, rows in pairs.items()}
+            pairs[f"t{number}"] = pair_right
+            sources[f"t{number}"] = right
+
+        # Output columns in the order of the SQL join queries
+        t1 = pairs["t1"]
+        columns = [(f"{table.name}_id", table.column_values("id", t1))]
+        columns.extend((column, table.column_values(column, t1)) for column in JOIN_COLUMNS)
+        if len(plan.joins) == 2:
+            first, second = plan.joins
+            columns.extend([
+                ("main_category", table.column_values("sub_category", t1)),
+                (f"{first.table}_id", sources["t2"].column_values("id", pairs["t2"])),
+                ("related_category1", sources["t2"].column_values("sub_category", pairs["t2"])),
+                (f"{second.table}_id", sources["t3"].column_values("id", pairs["t3"])),
+                ("related_category2", sources["t3"].column_values("sub_category", pairs["t3"])),
+            ])
+        else:
+            join = plan.joins[0]
+            columns.extend([
+                ("category", table.column_values("sub_category", t1)),
+                (f"{join.table}_id", sources["t2"].column_values("id", pairs["t2"])),
+                ("related_category", sources["t2"].column_values("sub_category", pairs["t2"])),
+            ])
+        names = [name for name, _ in columns]
+        return [dict(zip(names, row)) for row in zip(*(values for _, values in columns))]
+
+    def stream_plan(self, plan):
+        """Execute a plan over the loaded columns, yielding rows in FETCH_SIZE chunks"""
+        table = self.get_table(plan.table)
+        mask = self.filter_mask(table, plan.predicates)
+        if plan.group_by:
+            yield from self.execute_group(table, plan, mask)
+            return
+        if plan.joins and plan.join_mode != "rows":
+            yield from self.execute_related(table, plan, mask)
+            return
+        if plan.joins:
+            yield from self.execute_join(table, plan, mask)
+            return
+        indices = np.flatnonzero(mask)
+        if plan.sort:
+            indices = self.sort_indices(table, indices, plan.sort)
+        if plan.limit:
+            indices = indices[:plan.limit]
+        # Only the rows of the current chunk are decoded
+        for start in range(0, len(indices), FETCH_SIZE):
+            yield from table.rows(indices[start:start + FETCH_SIZE], plan.columns)
+
+    def _stream_plan(self, plan, query):
+        """Yield the rows of an already guarded plan through the result cache; the SQL text is display only"""
+        return self.result_cache.stream(plan, plan.tables, lambda: self.stream_plan(plan))
+
+    def iter_plan(self, plan):
+        """Run a plan without any prompts and yield the result rows"""
+        plan = self.guard_join(plan)
+        return self._stream_plan(plan, None)
@@ -1,22 +1,75 @@
 import os
 import pandas as pd
-from pymongo import MongoClient
+from pymongo import InsertOne, MongoClient, ReplaceOne
 from console_utils import ConsoleFormatter as cf
 from tabulate import tabulate
 import random
 import json
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import re
+from dataclasses import replace
+from column_cache import file_hash
+from csv_reader import LINK_COLUMNS, CSVReader
+from query_plan import AGGREGATE_LABELS, JOIN_COLUMNS, MAX_JOIN_ROWS, SUMMARY_GROUPS
+from result_cache import ResultCache
+
+# Documents per batch fetched from the server when streaming results
+CURSOR_BATCH_SIZE = 500
+
+# CSV rows read, converted and sent per unordered insert_many during import
+IMPORT_BATCH_SIZE = 1000
+
+# Secondary indexes created on every imported collection
+COLLECTION_INDEXES = [
+    [("sub_category", 1), ("numeric_rating", 1)],
+    [("main_category", 1), ("sub_category", 1)],
+    [("numeric_rating", 1)],
+    [("numeric_no_of_ratings", 1)],
+    [("numeric_price", 1)],
+]
+
+# Collections holding the per-category aggregates refreshed at import, the
+# import each collection last completed, and the CSV file each collection
+# was last loaded or synced from
+SUMMARY_COLLECTION = "category_summary"
+METADATA_COLLECTION = "import_metadata"
+MANIFEST_COLLECTION = "import_manifest"
+
+# Keys per delete_many when a sync removes documents
+DELETE_BATCH_SIZE = 500
 
 
 class NoSQLDatabaseHandler:
-    def __init__(self, connection_string, database):
-        self.client = MongoClient(connection_string)
+    def __init__(self, connection_string, database, cache_size=256, cache_ttl=300, client=None,
+                 max_join_rows=MAX_JOIN_ROWS):
+        # An existing client (e.g. a shared or mock client) can be passed in
+        self.client = client if client is not None else MongoClient(connection_string)
         self.db = self.client[database]
+        # Results of generated queries, dropped when their collections are reloaded
+        self.result_cache = ResultCache(max_entries=cache_size, ttl=cache_ttl)
+        self.max_join_rows = max_join_rows
+
+    def get_stats(self):
+        """Return runtime statistics of this handler"""
+        return {"result_cache": self.result_cache.stats()}
 
-    def import_data(self, folder_path, selected_files):
+    def import_data(self, folder_path, selected_files, create_indexes=True, batch_size=IMPORT_BATCH_SIZE, workers=1,
+                    drop_links=False):
         """
         Import CSV files into MongoDB collections.
+
+        Ratings, review counts and prices are also stored as numbers
+        (numeric_rating, numeric_no_of_ratings, numeric_price,
+        numeric_actual_price) and indexed unless `create_indexes=False`.
+
+        Each CSV is streamed in chunks of `batch_size` rows, and every chunk
+        is sent as one unordered insert_many. Up to `workers` threads send
+        batches at once, so memory use depends on the batch size, not on
+        the file size. Pass `drop_links=True` to leave out the image and
+        link fields. Documents carry the keys sync_data matches on.
         """
         print(cf.header("DATABASE IMPORT PROCESS"))
         
@@ -26,19 +79,216 @@ class NoSQLDatabaseHandler:
             
             print(f"\n{cf.info('Processing file:')} {cf.highlight(file)}")
             print(f"{cf.info('Collection name:')} {cf.highlight(collection_name)}")
-            
-            df = pd.read_csv(file_path)
-            print(f"{cf.info('Records read from CSV:')} {cf.highlight(len(df))}")
-            
+
+            # Mark the summary and the sync manifest stale before the documents change
+            source_hash = file_hash(file_path)
+            self.db[METADATA_COLLECTION].delete_one({"table_name": collection_name})
+            self.db[MANIFEST_COLLECTION].delete_one({"table_name": collection_name})
             self.db[collection_name].drop()
-            result = self.db[collection_name].insert_many(df.to_dict("records"))
-            print(cf.success(f"Successfully inserted {len(result.inserted_ids)} records"))
+            self.result_cache.invalidate(collection_name)
+            start = time.perf_counter()
+            reader = CSVReader(file_path, chunk_rows=batch_size, drop_columns=LINK_COLUMNS if drop_links else (),
+                               row_keys=True)
+            inserted = self._insert_streaming(self.db[collection_name], reader, workers)
+            elapsed = time.perf_counter() - start
+            rate = inserted / elapsed if elapsed > 0 else 0
+            print(cf.success(f"Successfully inserted {inserted} records in {elapsed:.2f}s ({rate:,.0f} docs/sec)"))
+
+            # Syncs look documents up by key whether or not the other indexes are built
+            self.db[collection_name].create_index("row_key", unique=True)
+            if create_indexes:
+                index_names = [self.db[collection_name].create_index(keys) for keys in COLLECTION_INDEXES]
+                print(cf.success(f"Created {len(index_names)} indexes: {', '.join(index_names)}"))
+
+            # Also drops the results cached by queries that ran during the import
+            self.refresh_summary(collection_name)
+            print(cf.success(f"Refreshed category summary of {collection_name}"))
+            if inserted == reader.rows:
+                self._write_manifest(collection_name, source_hash, reader.output_columns(), inserted)
         
         print(f"\n{cf.header('DATABASE STATUS')}")
         for collection in self.db.list_collection_names():
             count = self.db[collection].count_documents({})
             print(cf.info(f"Collection '{collection}': {count} documents"))
 
+    def _insert_streaming(self, collection, reader, workers):
+        """
+        Insert the chunks of a CSVReader into a collection and return the
+        number of documents inserted. At most two batches per worker are in
+        flight.
+        """
+        def insert(documents):
+            # Unordered: the server need not apply the batch in sequence
+            return len(collection.insert_many(documents, ordered=False).inserted_ids)
+
+        inserted = 0
+        start = time.perf_counter()
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for chunk in reader:
+                documents = chunk.astype(object).where(pd.notna(chunk), None).to_dict("records")
+                pending.append(pool.submit(insert, documents))
+                while len(pending) >= 2 * workers or (pending and pending[0].done()):
+                    inserted += pending.popleft().result()
+                    elapsed = time.perf_counter() - start
+                    rate = inserted / elapsed if elapsed > 0 else 0
+                    print(cf.info(f"  {inserted:,} documents ({rate:,.0f} docs/sec)"), end="\r", flush=True)
+            while pending:
+                inserted += pending.popleft().result()
+        print()
+        return inserted
+
+    def sync_data(self, folder_path, selected_files, batch_size=IMPORT_BATCH_SIZE, drop_links=False):
+        """
+        Bring imported collections up to date with their CSV files by
+        applying only the documents that changed since the last import or
+        sync.
+
+        A file whose content hash matches import_manifest is skipped. Otherwise
+        its rows are matched on row_key: new keys are inserted, keys whose
+        row_hash differs are replaced and keys no longer in the file are
+        deleted. The manifest is written last, so an interrupted sync is
+        completed by the next one. Collections without a manifest are
+        imported in full.
+        """
+        print(cf.header("DATABASE SYNC PROCESS"))
+        start = time.perf_counter()
+        results = []
+        full_imports = []
+        for file in selected_files:
+            print(f"\n{cf.info('Processing file:')} {cf.highlight(file)}")
+            reader = CSVReader(os.path.join(folder_path, file), chunk_rows=batch_size,
+                               drop_columns=LINK_COLUMNS if drop_links else (), row_keys=True)
+            result = self._sync_collection(reader)
+            if result is None:
+                print(cf.warning("No sync manifest for this collection, it will be imported in full"))
+                full_imports.append(file)
+            else:
+                results.append(result)
+        elapsed = time.perf_counter() - start
+
+        if results:
+            rows = [[result["table"], result["inserted"], result["updated"], result["deleted"], result["seconds"]]
+                    for result in results]
+            print(tabulate(rows, headers=["Collection", "Inserted", "Updated", "Deleted", "Time (s)"], floatfmt=".2f"))
+            changes = sum(result["inserted"] + result["updated"] + result["deleted"] for result in results)
+            print(cf.info(f"Total: {changes} changed documents in {elapsed:.2f}s"))
+        if full_imports:
+            self.import_data(folder_path, full_imports, batch_size=batch_size, drop_links=drop_links)
+
+    def _sync_collection(self, reader):
+        """
+        Apply the difference between a CSVReader's file and its collection.
+        Returns the documents inserted, updated and deleted, or None when the
+        collection has no usable manifest.
+        """
+        collection_name = os.path.basename(reader.file_path).replace(" ", "_").replace(".csv", "").lower()
+        columns = reader.output_columns()
+        manifest = self.db[MANIFEST_COLLECTION].find_one({"table_name": collection_name})
+        if manifest is None or manifest["columns"] != columns:
+            return None
+
+        start = time.perf_counter()
+        source_hash = file_hash(reader.file_path)
+        result = {"table": collection_name, "inserted": 0, "updated": 0, "deleted": 0}
+        if manifest["source_hash"] == source_hash:
+            print(cf.info(f"{collection_name} is unchanged"))
+            return {**result, "seconds": time.perf_counter() - start}
+
+        collection = self.db[collection_name]
+        existing = {document["row_key"]: document["row_hash"]
+                    for document in collection.find({}, {"row_key": 1, "row_hash": 1, "_id": 0})}
+
+        def mark_stale():
+            # Before the first write; the summary is rebuilt once the sync is applied
+            if not (result["inserted"] or result["updated"] or result["deleted"]):
+                self.db[METADATA_COLLECTION].delete_one({"table_name": collection_name})
+
+        seen = set()
+        for df in reader:
+            previous = df["row_key"].map(existing)
+            new = previous.isna()
+            changed = ~new & (previous != df["row_hash"])
+            seen.update(df["row_key"])
+            if not (new.any() or changed.any()):
+                continue
+            rows = df[new | changed]
+            documents = rows.astype(object).where(pd.notna(rows), None).to_dict("records")
+            requests = [InsertOne(document) if is_new else ReplaceOne({"row_key": document["row_key"]}, document)
+                        for document, is_new in zip(documents, new[new | changed])]
+            mark_stale()
+            collection.bulk_write(requests, ordered=False)
+            result["inserted"] += int(new.sum())
+            result["updated"] += int(changed.sum())
+
+        removed = [key for key in existing if key not in seen]
+        if removed:
+            mark_stale()
+        for offset in range(0, len(removed), DELETE_BATCH_SIZE):
+            collection.delete_many({"row_key": {"$in": removed[offset:offset + DELETE_BATCH_SIZE]}})
+        result["deleted"] = len(removed)
+
+        if result["inserted"] or result["updated"] or result["deleted"]:
+            self.refresh_summary(collection_name)
+        self._write_manifest(collection_name, source_hash, columns,
+                             len(existing) + result["inserted"] - result["deleted"])
+        elapsed = time.perf_counter() - start
+        print(cf.success(f"Applied {result['inserted']} inserts, {result['updated']} updates and "
+                         f"{result['deleted']} deletes in {elapsed:.2f}s"))
+        return {**result, "seconds": elapsed}
+
+    def _write_manifest(self, collection_name, source_hash, columns, row_count):
+        """Record the CSV file a collection was loaded or synced from"""
+        self.db[MANIFEST_COLLECTION].replace_one(
+            {"table_name": collection_name},
+            {"table_name": collection_name, "source_hash": source_hash, "columns": columns,
+             "row_count": row_count, "synced_at": datetime.now()},
+            upsert=True,
+        )
+
+    def refresh_summary(self, collection_name):
+        """
+        Rebuild the category summary of a loaded collection and record the
+        import; the summary is used only while both carry the same import_id.
+        """
+        import_id = uuid.uuid4().hex
+        summaries = []
+        for group_column in SUMMARY_GROUPS:
+            pipeline = [{"$group": {
+                "_id": f"${group_column}",
+                "row_count": {"$sum": 1},
+                "avg_rating": {"$avg": "$numeric_rating"},
+                "min_rating": {"$min": "$numeric_rating"},
+                "max_rating": {"$max": "$numeric_rating"},
+                "total_reviews": {"$sum": "$numeric_no_of_ratings"},
+                "avg_price": {"$avg": "$numeric_price"},
+                "min_price": {"$min": "$numeric_price"},
+                "max_price": {"$max": "$numeric_price"},
+            }}]
+            for result in self.db[collection_name].aggregate(pipeline):
+                category = result.pop("_id")
+                summaries.append({"table_name": collection_name, "group_column": group_column,
+                                  "category": category, "import_id": import_id, **result})
+        summary = self.db[SUMMARY_COLLECTION]
+        summary.delete_many({"table_name": collection_name})
+        if summaries:
+            summary.insert_many(summaries)
+        self.db[METADATA_COLLECTION].replace_one(
+            {"table_name": collection_name},
+            {"table_name": collection_name, "import_id": import_id,
+             "row_count": self.db[collection_name].count_documents({}), "imported_at": datetime.now()},
+            upsert=True,
+        )
+        self.result_cache.invalidate(collection_name)
+
+    def summary_import_id(self, collection_name):
+        """Import id of the collection's category summary, or None if it is missing or stale"""
+        metadata = self.db[METADATA_COLLECTION].find_one({"table_name": collection_name})
+        if metadata is None:
+            return None
+        current = self.db[SUMMARY_COLLECTION].find_one({"table_name": collection_name, "import_id": metadata["import_id"]})
+        return metadata["import_id"] if current else None
+
     def format_value(self, value, field_name):
         """Format value based on field type"""
         try:
@@ -55,9 +305,25 @@ class NoSQLDatabaseHandler:
                 return value
             else:
                 return str(value)
-        except (ValueError, AttributeError):
+        except (ValueError, AttributeError, TypeError):
             return str(value)
 
+    def format_group(self, category, result, aggregates):
+        """Format one $group result document"""
+        parts = [f"Category: {category}"]
+        for aggregate in aggregates:
+            value = result.get(aggregate.alias)
+            label = AGGREGATE_LABELS.get(aggregate.alias, aggregate.alias)
+            if value is None:
+                parts.append(f"{label}: -")
+            elif aggregate.func == "count":
+                parts.append(f"{label}: {value}")
+            elif aggregate.func == "sum":
+                parts.append(f"{label}: {int(value):,}")
+            else:
+                parts.append(f"{label}: {float(value):.2f}")
+        return ", ".join(parts)
+
     def get_random_nosql_examples(self, collection_name):
         """Get random NoSQL query examples based on current query type"""
         examples = [
@@ -70,19 +336,19 @@ class NoSQLDatabaseHandler:
             # Rating query example
             {
                 "query": f"show me {collection_name.replace('_', ' ')} with rating greater than 4.5 limit 10 records",
-                "pipeline": f"db.{collection_name}.find({{ ratings: {{ $gt: '4.5' }} }}, {{ name: 1, ratings: 1, no_of_ratings: 1, discount_price: 1, actual_price: 1, _id: 0 }}).limit(10)",
+                "pipeline": f"db.{collection_name}.find({{ numeric_rating: {{ $gt: 4.5 }} }}, {{ name: 1, ratings: 1, no_of_ratings: 1, discount_price: 1, actual_price: 1, _id: 0 }}).limit(10)",
                 "explanation": "This pipeline filters documents with high ratings and returns up to 10 records."
             },
             # Comment count query example
             {
                 "query": f"show me {collection_name.replace('_', ' ')} with comments greater than 5000 limit 10 records",
-                "pipeline": f"db.{collection_name}.find({{ no_of_ratings: {{ $gt: '5000' }} }}, {{ name: 1, ratings: 1, no_of_ratings: 1, discount_price: 1, actual_price: 1, _id: 0 }}).limit(10)",
+                "pipeline": f"db.{collection_name}.find({{ numeric_no_of_ratings: {{ $gt: 5000 }} }}, {{ name: 1, ratings: 1, no_of_ratings: 1, discount_price: 1, actual_price: 1, _id: 0 }}).limit(10)",
                 "explanation": "This pipeline finds popular products with many reviews."
             },
             # Example of combined conditions
             {
                 "query": f"show me {collection_name.replace('_', ' ')} with rating greater than 4 and comments greater than 1000",
-                "pipeline": f"db.{collection_name}.find({{ $and: [{{ ratings: {{ $gt: '4' }}, no_of_ratings: {{ $gt: '1000' }} }}] }}, {{ name: 1, ratings: 1, no_of_ratings: 1, discount_price: 1, actual_price: 1, _id: 0 }})",
+                "pipeline": f"db.{collection_name}.find({{ $and: [{{ numeric_rating: {{ $gt: 4 }}, numeric_no_of_ratings: {{ $gt: 1000 }} }}] }}, {{ name: 1, ratings: 1, no_of_ratings: 1, discount_price: 1, actual_price: 1, _id: 0 }})",
                 "explanation": "This pipeline combines rating and review count conditions."
             },
             # Basic group statistics example
@@ -94,15 +360,15 @@ class NoSQLDatabaseHandler:
             # Example of scoring group statistics
             {
                 "query": f"show average rating for {collection_name.replace('_', ' ')} group by category",
-                "pipeline": f"db.{collection_name}.aggregate([{{ $group: {{ _id: '$sub_category', avg_rating: {{ $avg: {{ $toDouble: '$ratings' }} }} }} }}])",
+                "pipeline": f"db.{collection_name}.aggregate([{{ $group: {{ _id: '$sub_category', avg_rating: {{ $avg: '$numeric_rating' }} }} }}])",
                 "explanation": "This pipeline calculates average rating for each category."
             },
             # High-rated product grouping statistics
             {
                 "query": f"show total number of {collection_name.replace('_', ' ')} with rating greater than 4 group by category",
                 "pipeline": f"""db.{collection_name}.aggregate([
-                    {{ $match: {{ ratings: {{ $gt: '4' }} }} }},
-                    {{ $group: {{ _id: '$sub_category', count: {{ $sum: 1 }}, avg_rating: {{ $avg: {{ $toDouble: '$ratings' }} }} }} }}
+                    {{ $match: {{ numeric_rating: {{ $gt: 4 }} }} }},
+                    {{ $group: {{ _id: '$sub_category', count: {{ $sum: 1 }}, avg_rating: {{ $avg: '$numeric_rating' }} }} }}
                 ])""",
                 "explanation": "This pipeline groups high-rated products by category and shows their count and average rating."
             },
@@ -110,8 +376,8 @@ class NoSQLDatabaseHandler:
             {
                 "query": f"show total number of {collection_name.replace('_', ' ')} with comments greater than 1000 group by category",
                 "pipeline": f"""db.{collection_name}.aggregate([
-                    {{ $match: {{ no_of_ratings: {{ $gt: '1000' }} }} }},
-                    {{ $group: {{ _id: '$sub_category', count: {{ $sum: 1 }}, avg_comments: {{ $avg: {{ $toDouble: '$no_of_ratings' }} }} }} }}
+                    {{ $match: {{ numeric_no_of_ratings: {{ $gt: 1000 }} }} }},
+                    {{ $group: {{ _id: '$sub_category', count: {{ $sum: 1 }}, avg_comments: {{ $avg: '$numeric_no_of_ratings' }} }} }}
                 ])""",
                 "explanation": "This pipeline groups popular products by category and shows their count and average reviews."
             },
@@ -119,12 +385,12 @@ class NoSQLDatabaseHandler:
             {
                 "query": f"show total number of {collection_name.replace('_', ' ')} with rating greater than 4 and comments greater than 1000 group by category",
                 "pipeline": f"""db.{collection_name}.aggregate([
-                    {{ $match: {{ $and: [{{ ratings: {{ $gt: '4' }}, no_of_ratings: {{ $gt: '1000' }} }}] }} }},
+                    {{ $match: {{ $and: [{{ numeric_rating: {{ $gt: 4 }}, numeric_no_of_ratings: {{ $gt: 1000 }} }}] }} }},
                     {{ $group: {{ 
                         _id: '$sub_category', 
                         count: {{ $sum: 1 }},
-                        avg_rating: {{ $avg: {{ $toDouble: '$ratings' }} }},
-                        avg_comments: {{ $avg: {{ $toDouble: '$no_of_ratings' }} }}
+                        avg_rating: {{ $avg: '$numeric_rating' }},
+                        avg_comments: {{ $avg: '$numeric_no_of_ratings' }}
                     }} }}
                 ])""",
                 "explanation": "This pipeline groups high-rated and popular products by category with detailed statistics."
@@ -139,19 +405,35 @@ class NoSQLDatabaseHandler:
             {
                 "query": f"show me {collection_name.replace('_', ' ')} including air conditioners with rating greater than 4",
                 "pipeline": f"""db.{collection_name}.aggregate([
-                    {{ $lookup: {{ from: 'air_conditioners', localField: 'sub_category', foreignField: 'sub_category', as: 'related_products' }} }},
-                    {{ $match: {{ ratings: {{ $gt: '4' }} }} }},
-                    {{ $project: {{ name: 1, ratings: 1, no_of_ratings: 1, discount_price: 1, actual_price: 1, related_products: 1 }} }}
+                    {{ $match: {{ numeric_rating: {{ $gt: 4 }} }} }},
+                    {{ $lookup: {{
+                        from: 'air_conditioners',
+                        let: {{ key: '$sub_category' }},
+                        pipeline: [
+                            {{ $match: {{ $expr: {{ $eq: ['$sub_category', '$$key'] }} }} }},
+                            {{ $limit: 100000 }},
+                            {{ $project: {{ _id: 1, sub_category: 1 }} }}
+                        ],
+                        as: 't2'
+                    }} }},
+                    {{ $unwind: {{ path: '$t2', preserveNullAndEmptyArrays: true }} }},
+                    {{ $project: {{ _id: 0, name: 1, ratings: 1, no_of_ratings: 1, discount_price: 1, actual_price: 1, related_category: '$t2.sub_category' }} }}
                 ])""",
-                "explanation": "This pipeline performs a lookup with air conditioners and filters by rating."
+                "explanation": "This pipeline filters by rating first, then looks up matching air conditioners by category; the lookup only returns the fields it needs."
             },
             # Three-table cascade example
             {
                 "query": f"show me {collection_name.replace('_', ' ')} together with air conditioners connected to car and motorbike products",
                 "pipeline": f"""db.{collection_name}.aggregate([
-                    {{ $lookup: {{ from: 'air_conditioners', localField: 'sub_category', foreignField: 'sub_category', as: 'ac_products' }} }},
-                    {{ $lookup: {{ from: 'all_car_and_motorbike_products', localField: 'main_category', foreignField: 'main_category', as: 'car_products' }} }},
-                    {{ $project: {{ name: 1, ratings: 1, no_of_ratings: 1, discount_price: 1, actual_price: 1, ac_products: 1, car_products: 1 }} }}
+                    {{ $lookup: {{ from: 'air_conditioners', let: {{ key: '$sub_category' }}, pipeline: [
+                        {{ $match: {{ $expr: {{ $eq: ['$sub_category', '$$key'] }} }} }}, {{ $limit: 100000 }}, {{ $project: {{ _id: 1, sub_category: 1 }} }}
+                    ], as: 't2' }} }},
+                    {{ $unwind: {{ path: '$t2', preserveNullAndEmptyArrays: true }} }},
+                    {{ $lookup: {{ from: 'all_car_and_motorbike_products', let: {{ key: '$main_category' }}, pipeline: [
+                        {{ $match: {{ $expr: {{ $eq: ['$main_category', '$$key'] }} }} }}, {{ $limit: 100000 }}, {{ $project: {{ _id: 1, sub_category: 1 }} }}
+                    ], as: 't3' }} }},
+                    {{ $unwind: {{ path: '$t3', preserveNullAndEmptyArrays: true }} }},
+                    {{ $project: {{ _id: 0, name: 1, ratings: 1, no_of_ratings: 1, discount_price: 1, actual_price: 1, related_category1: '$t2.sub_category', related_category2: '$t3.sub_category' }} }}
                 ])""",
                 "explanation": "This pipeline performs a three-way lookup across all product categories."
             }
@@ -181,25 +463,257 @@ class NoSQLDatabaseHandler:
         
         return random.sample(relevant_examples, 3)
 
-    def get_mongo_query_string(self, collection_name, pipeline=None, condition=None):
+    def compile_filter(self, predicates):
+        """Render plan predicates as a MongoDB filter document"""
+        conditions = []
+        for predicate in predicates:
+            if predicate.op == "between":
+                low, high = predicate.value
+                conditions.append({predicate.field: {"$gte": low, "$lte": high}})
+            elif predicate.op == "gt":
+                conditions.append({predicate.field: {"$gt": predicate.value}})
+            else:
+                raise ValueError(f"Unsupported predicate operator: {predicate.op}")
+        if len(conditions) > 1:
+            return {"$and": conditions}
+        return conditions[0] if conditions else {}
+
+    def compile_aggregate(self, aggregate):
+        """Render one plan aggregate as a $group accumulator"""
+        if aggregate.func == "count":
+            return {"$sum": 1}
+        return {f"${aggregate.func}": f"${aggregate.field}"}
+
+    def compile_lookup(self, plan):
+        """
+        Compile a two- or three-collection join into an aggregate pipeline.
+
+        Every $lookup uses the pipeline form. Its sub-pipeline matches the
+        join key, which the category indexes of the joined collection serve,
+        stops after the documents that can be used and projects only the
+        returned fields, so the embedded arrays stay small. As in the SQL
+        backend, filters and (for LEFT joins) the limit apply before joining.
+        """
+        pipeline = []
+        query_filter = self.compile_filter(plan.predicates)
+        if query_filter:
+            pipeline.append({"$match": query_filter})
+        if plan.limit and plan.join_mode == "rows" and all(join.join_type == "LEFT JOIN" for join in plan.joins):
+            pipeline.append({"$limit": plan.limit})
+
+        output = {"_id": 0, f"{plan.table}_id": {"$toString": "$_id"}, **{column: 1 for column in JOIN_COLUMNS}}
+        output["main_category" if len(plan.joins) == 2 and plan.join_mode == "rows" else "category"] = "$sub_category"
+        for number, join in enumerate(plan.joins, 2):
+            alias = f"t{number}"
+            if plan.join_mode == "count":
+                # Related documents are counted once per category after the
+                # pipeline; the join key is kept for that
+                output[join.on] = 1
+                if join.join_type == "LEFT JOIN":
+                    continue
+            if plan.join_mode == "rows":
+                # Each row yields at most `limit` joined rows; unbounded joins
+                # passed guard_join, so no row has more than max_join_rows
+                bound, fields = plan.limit or self.max_join_rows, {"_id": 1, "sub_category": 1}
+            else:
+                # Only whether a related document exists matters
+                bound, fields = 1, {"_id": 1}
+            pipeline.append({"$lookup": {
+                "from": join.table,
+                "let": {"key": f"${join.on}"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": [f"${join.on}", "$$key"]}}},
+                    {"$limit": bound},
+                    {"$project": fields},
+                ],
+                "as": alias,
+            }})
+            if join.join_type == "INNER JOIN" or plan.join_mode != "rows":
+                pipeline.append({"$match": {alias: {"$ne": []}}})
+            if plan.join_mode == "rows":
+                pipeline.append({"$unwind": {"path": f"${alias}", "preserveNullAndEmptyArrays": join.join_type == "LEFT JOIN"}})
+                suffix = number - 1 if len(plan.joins) == 2 else ""
+                output[f"{join.table}_id"] = {"$toString": f"${alias}._id"}
+                # $ifNull keeps the field (as null) when a LEFT join found nothing
+                output[f"related_category{suffix}"] = {"$ifNull": [f"${alias}.sub_category", None]}
+        if plan.limit:
+            pipeline.append({"$limit": plan.limit})
+        pipeline.append({"$project": output})
+
+        command = {"collection": plan.table, "pipeline": pipeline}
+        if plan.join_mode == "count":
+            command["related_counts"] = [{"collection": join.table, "on": join.on} for join in plan.joins]
+        return command
+
+    def category_counts(self, collection_name, columns, predicates=()):
+        """Number of documents of a collection per combination of values of `columns`"""
+        pipeline = []
+        query_filter = self.compile_filter(predicates)
+        if query_filter:
+            pipeline.append({"$match": query_filter})
+        pipeline.append({"$group": {"_id": {column: f"${column}" for column in columns}, "count": {"$sum": 1}}})
+        return {
+            tuple(result["_id"].get(column) for column in columns): result["count"]
+            for result in self.db[collection_name].aggregate(pipeline)
+        }
+
+    def estimate_join_rows(self, plan):
+        """
+        Exact number of documents a "rows" join returns before its limit,
+        from per-category counts of each collection instead of running it.
+        """
+        keys = [join.on for join in plan.joins]
+        left = self.category_counts(plan.table, keys, plan.predicates)
+        related = [self.category_counts(join.table, [join.on]) for join in plan.joins]
+        total = 0
+        for values, count in left.items():
+            rows = count
+            for join, value, counts in zip(plan.joins, values, related):
+                matches = counts.get((value,), 0)
+                if join.join_type == "LEFT JOIN":
+                    matches = max(matches, 1)
+                rows *= matches
+            total += rows
+        return total
+
+    def guard_join(self, plan):
+        """
+        Return the plan to run: an unbounded join estimated above
+        max_join_rows is downgraded to "count related" with a warning.
+        """
+        if not plan.joins or plan.join_mode != "rows" or plan.limit:
+            return plan
+        estimate = self.estimate_join_rows(plan)
+        if estimate <= self.max_join_rows:
+            return plan
+        print(cf.warning(f"This join would return about {estimate:,} documents (limit {self.max_join_rows:,}); "
+                         f"showing the number of related documents instead. Add 'limit N records' to see joined documents."))
+        return replace(plan, join_mode="count")
+
+    def compile_plan(self, plan):
+        """
+        Compile a QueryPlan into a MongoDB command: a `find` with filter,
+        projection, sort and limit, or an `aggregate` pipeline for grouped
+        queries and joins.
+
+        Sort and limit run on the server, so "in ascending price limit 10
+        records" reads the first 10 entries of the numeric_price index
+        instead of sorting or transferring the whole collection.
+        """
+        if plan.joins and not plan.group_by:
+            return self.compile_lookup(plan)
+        import_id = self.summary_import_id(plan.table) if plan.summary_columns else None
+        if import_id:
+            # Precomputed at import: one document per category
+            project = {"_id": "$category"}
+            project.update({agg.alias: f"${column}" for column, agg in zip(plan.summary_columns, plan.aggregates)})
+            return {"collection": SUMMARY_COLLECTION, "pipeline": [
+                {"$match": {"table_name": plan.table, "group_column": plan.group_by, "import_id": import_id}},
+                {"$project": project},
+                {"$sort": {plan.aggregates[0].alias: -1}},
+            ]}
+        query_filter = self.compile_filter(plan.predicates)
+        if plan.group_by:
+            pipeline = []
+            if query_filter:
+                pipeline.append({"$match": query_filter})
+            # Every aggregate is an accumulator of a single $group
+            accumulators = {aggregate.alias: self.compile_aggregate(aggregate) for aggregate in plan.aggregates}
+            groups = [
+                {"$group": {"_id": f"${plan.group_by}", **accumulators}},
+                {"$sort": {plan.aggregates[0].alias: -1}},
+            ]
+            if not plan.totals:
+                return {"collection": plan.table, "pipeline": pipeline + groups}
+            # $facet feeds the same scan to the per-group and the overall
+            # $group; the totals document follows the groups
+            pipeline.append({"$facet": {
+                "groups": groups + [{"$addFields": {"is_total": 0}}],
+                "totals": [{"$group": {"_id": None, **accumulators}}, {"$addFields": {"is_total": 1}}],
+            }})
+            pipeline.append({"$project": {"rows": {"$concatArrays": ["$groups", "$totals"]}}})
+            pipeline.append({"$unwind": "$rows"})
+            pipeline.append({"$replaceRoot": {"newRoot": "$rows"}})
+            return {"collection": plan.table, "pipeline": pipeline}
+        return {
+            "collection": plan.table,
+            "filter": query_filter,
+            "projection": {**{column: 1 for column in plan.columns}, "_id": 0},
+            "sort": [[plan.sort.field, -1 if plan.sort.descending else 1]] if plan.sort else None,
+            "limit": plan.limit,
+        }
+
+    def get_mongo_query_string(self, command):
         """Generate MongoDB query string"""
-        if pipeline:
+        collection_name = command["collection"]
+        if "pipeline" in command:
             # aggregate
-            return f"db.{collection_name}.aggregate({str(pipeline)})"
+            formatted_pipeline = json.dumps(command["pipeline"], indent=4, ensure_ascii=False).replace('"', '')
+            query_str = f"db.{collection_name}.aggregate({formatted_pipeline})"
+            # Per-category counts attached to "count related" results
+            for related in command.get("related_counts", []):
+                query_str += f"\ndb.{related['collection']}.aggregate([{{ $group: {{ _id: '${related['on']}', count: {{ $sum: 1 }} }} }}])"
+            return query_str
+        # find
+        formatted_filter = json.dumps(command["filter"], indent=4, ensure_ascii=False).replace('"', '')
+        formatted_projection = json.dumps(command["projection"], indent=4).replace('"', '')
+        query_str = f"db.{collection_name}.find({formatted_filter}, {formatted_projection})"
+        if command["sort"]:
+            query_str += f".sort({{ {', '.join(f'{field}: {direction}' for field, direction in command['sort'])} }})"
+        if command["limit"]:
+            query_str += f".limit({command['limit']})"
+        return query_str
+
+    def _stream_command(self, command):
+        """Yield the documents of a command, CURSOR_BATCH_SIZE documents per round trip"""
+        collection = self.db[command["collection"]]
+        if "pipeline" in command:
+            cursor = collection.aggregate(command["pipeline"], batchSize=CURSOR_BATCH_SIZE)
         else:
-            # find
+            cursor = collection.find(command["filter"], command["projection"]).batch_size(CURSOR_BATCH_SIZE)
+            if command["sort"]:
+                cursor = cursor.sort([(field, direction) for field, direction in command["sort"]])
+            if command["limit"]:
+                cursor = cursor.limit(command["limit"])
+        try:
+            yield from cursor
+        finally:
+            # Kill the server-side cursor if the caller stopped early
+            cursor.close()
 
-            projection = "{ name: 1, ratings: 1, no_of_ratings: 1, discount_price: 1, actual_price: 1, _id: 0 }"
-            if condition:
-                return f"db.{collection_name}.find({condition}, {projection})"
-            else:
-                return f"db.{collection_name}.find({{}}, {projection})"
+    def _stream_related_counts(self, command):
+        """Yield the documents of a "count related" command with the number of related documents per join"""
+        related = [(spec, self.category_counts(spec["collection"], [spec["on"]])) for spec in command["related_counts"]]
+        keys = {spec["on"] for spec in command["related_counts"]}
+        for document in self._stream_command(command):
+            for spec, counts in related:
+                value = document.get(spec["on"])
+                document[f"{spec['collection']}_count"] = counts.get((value,), 0) if value is not None else 0
+            for key in keys:
+                document.pop(key, None)
+            yield document
 
-    def query(self, collection_name, condition=None, limit=5, group_by=None, aggregate=None, order_by=None):
+    def _stream_plan(self, plan, command):
+        """Yield the documents of the compiled command of an already guarded plan, through the result cache"""
+        cache_key = json.dumps(command, sort_keys=True, ensure_ascii=False)
+        stream = self._stream_related_counts if "related_counts" in command else self._stream_command
+        return self.result_cache.stream(cache_key, plan.tables, lambda: stream(command))
+
+    def iter_plan(self, plan):
+        """Run a plan without any prompts and yield the result documents as they arrive"""
+        plan = self.guard_join(plan)
+        return self._stream_plan(plan, self.compile_plan(plan))
+
+    def execute_plan(self, plan):
+        """Run a plan without any prompts and return the result documents"""
+        return list(self.iter_plan(plan))
+
+    def query(self, plan):
         """
         Perform NoSQL query with optional filtering, grouping, and aggregation.
         """
         print(cf.header("QUERY EXECUTION"))
+        collection_name = plan.table
 
         # Get random examples
         examples = self.get_random_nosql_examples(collection_name)
@@ -213,137 +727,33 @@ class NoSQLDatabaseHandler:
 
         # Current Query
         print(f"\n{cf.info('Current Query:')}")
-        
-        # Build query condition
-        query_dict = {}
-        if condition:
-            conditions = []
-            
-            # Parse rating condition
-            if "'ratings'" in condition:
-                rating_match = re.search(r"'ratings':\s*{\s*'\$gt':\s*'([\d.]+)'\s*}", condition)
-                if rating_match:
-                    conditions.append({"ratings": {"$gt": rating_match.group(1)}})
-            
-            # Parsing the number of comments condition
-            if "'no_of_ratings'" in condition:
-                comments_match = re.search(r"'no_of_ratings':\s*{\s*'\$gt':\s*'(\d+)'\s*}", condition)
-                if comments_match:
-                    conditions.append({"no_of_ratings": {"$gt": comments_match.group(1)}})
-            
-            # If there are multiple conditions, use $and
-            if len(conditions) > 1:
-                query_dict = {"$and": conditions}
-            elif len(conditions) == 1:
-                query_dict = conditions[0]
-        
-        # Constructing a query string (for display)
-        query_str = f"db.{collection_name}.find("
-        if query_dict:
-            # Format query conditions to use a more compact format
-            if "$and" in query_dict:
-                conditions = []
-                for cond in query_dict["$and"]:
-                    field = list(cond.keys())[0]
-                    operator = list(cond[field].keys())[0]
-                    value = cond[field][operator]
-                    conditions.append(f"'{field}': {{'{operator}': '{value}'}}")
-                formatted_query = "{\n    '$and': [{\n        " + "},\n        {".join(conditions) + "\n    }]"
-                query_str += formatted_query + "}"
-            else:
-                field = list(query_dict.keys())[0]
-                operator = list(query_dict[field].keys())[0]
-                value = query_dict[field][operator]
-                formatted_query = "{\n    " + f"'{field}': {{'{operator}': '{value}'}}" + "\n}"
-                query_str += formatted_query
-        else:
-            query_str += "{}"
-        
-        # Add a projection, using the same formatting
-        projection = {
-            "name": 1,
-            "ratings": 1,
-            "no_of_ratings": 1,
-            "discount_price": 1,
-            "actual_price": 1,
-            "_id": 0
-        }
-        formatted_projection = json.dumps(projection, indent=4).replace('"', "")
-        query_str += ", " + formatted_projection
-        
-        if limit:
-            query_str += f").limit({limit})"
-        else:
-            query_str += ")"
-
+        command = self.compile_plan(plan)
         print(f"\n{cf.info('MongoDB Query:')}")
-        print(cf.highlight(query_str))
-
-        # Construct pipeline or query conditions
-        if group_by or aggregate:
-            # Aggregation query
-            pipeline = []
-            
-            # Add matching conditions (if any)
-            if "rating greater than" in str(condition):
-                match = re.search(r"ratings > ([\d.]+)", str(condition))
-                if match:
-                    rating_value = match.group(1)
-                    pipeline.append({"$match": {"ratings": {"$gt": rating_value}}})
-            
-            # Add grouping stage
-            if group_by:
-                group_stage = {
-                    "_id": f"${group_by}",
-                    "count": {"$sum": 1}
-                }
-                pipeline.append({"$group": group_stage})
-            
-            # Add sort
-            pipeline.append({"$sort": {"count": -1}})
-            
-            # Build query string
-            query_str = f"db.{collection_name}.aggregate("
-            formatted_pipeline = json.dumps(pipeline, indent=4).replace('"', '')
-            query_str += formatted_pipeline + ")"
-            
-            print(f"\n{cf.info('MongoDB Query:')}")
-            print(cf.highlight(query_str))
-            
-            print(f"{cf.info('Pipeline Explanation:')}")
-            explanation = "This pipeline "
-            if "rating greater than" in str(condition):
-                explanation += "filters documents by rating, "
-            explanation += f"groups them by {group_by} and counts documents in each group"
-            print(cf.highlight(explanation + "."))
-
-        else:
-            # Ordinary query
-            # Show complete MongoDB find query
-            query_str = self.get_mongo_query_string(collection_name, condition=condition)
-            if limit:
-                query_str += f".limit({limit})"
-            if order_by:
-                # Convert order_by to sort syntax
-                sort_field = list(order_by["$sort"].keys())[0]
-                sort_order = list(order_by["$sort"].values())[0]
-                query_str += f".sort({ {sort_field}: {sort_order} })"
-            print(cf.highlight(query_str))
+        print(cf.highlight(self.get_mongo_query_string(command)))
         
         print(f"{cf.info('Query Explanation:')}")
         explanation = "This query "
-        if condition:
+        if plan.predicates:
             explanation += "filters documents based on conditions"
         else:
             explanation += "retrieves all documents"
-        if group_by:
-            explanation += f", groups them by {group_by}"
-        if aggregate:
-            explanation += f" and performs {aggregate} aggregation"
-        if order_by:
-            explanation += ", applies sorting"
-        if limit:
-            explanation += f", and limits results to {limit} documents"
+        if plan.group_by:
+            explanation += f", groups them by {plan.group_by}"
+            explanation += f" and computes {', '.join(agg.alias for agg in plan.aggregates)}"
+            if plan.totals:
+                explanation += ", with a totals document from the same scan"
+        elif plan.joins:
+            lookups = ", ".join(f"{join.table} on {join.on}" for join in plan.joins)
+            if plan.join_mode == "semi":
+                explanation += f", keeping those with related documents in {lookups}"
+            elif plan.join_mode == "count":
+                explanation += f", with the number of related documents in {lookups}"
+            else:
+                explanation += f", looks up related documents in {lookups}"
+        elif plan.sort:
+            explanation += f", sorts them by {plan.sort.field} {'descending' if plan.sort.descending else 'ascending'} on the server"
+        if plan.limit:
+            explanation += f", and limits results to {plan.limit} documents"
         print(cf.highlight(explanation + "."))
 
         # Add execution confirmation
@@ -354,65 +764,42 @@ class NoSQLDatabaseHandler:
 
         # Run query and display the results
         try:
-            if group_by or aggregate:
+            # An oversized join is downgraded here, so that a failed estimate is reported like the query's own errors
+            guarded = self.guard_join(plan)
+            if guarded is not plan:
+                plan, command = guarded, self.compile_plan(guarded)
+
+            if plan.group_by:
                 # Aggregation query
-                results = list(self.db[collection_name].aggregate(pipeline))
-                print(cf.success(f"\nFound {len(results)} groups"))
                 print(cf.separator())
-                for result in results:
-                    if aggregate == "count":
-                        print(cf.highlight(f"Category: {result['_id']}, Count: {result['count']}"))
-                    elif aggregate == "AVG_RATING":
-                        print(cf.highlight(f"Category: {result['_id']}, Average Rating: {result['average_rating']:.2f}"))
+                found = 0
+                for result in self._stream_plan(plan, command):
+                    found += 1
+                    category = "All categories" if result.get("is_total") else result["_id"]
+                    print(cf.highlight(self.format_group(category, result, plan.aggregates)))
+                print(cf.separator())
+                print(cf.success(f"Found {found} groups"))
             else:
                 # Ordinary query
                 try:
-                    # Execute query
-                    projection = {
-                        "name": 1,
-                        "ratings": 1,
-                        "no_of_ratings": 1,
-                        "discount_price": 1,
-                        "actual_price": 1,
-                        "_id": 0
-                    }
-                    
-                    # Parse query conditions
-                    if condition and "$and" in condition:
-                        # Handling multiple condition queries
-                        conditions = []
-                        if "'ratings'" in condition:
-                            rating_match = re.search(r"'ratings':\s*{\s*'\$gt':\s*'([\d.]+)'\s*}", condition)
-                            if rating_match:
-                                conditions.append({"ratings": {"$gt": rating_match.group(1)}})
-                        if "'no_of_ratings'" in condition:
-                            comments_match = re.search(r"'no_of_ratings':\s*{\s*'\$gt':\s*'(\d+)'\s*}", condition)
-                            if comments_match:
-                                conditions.append({"no_of_ratings": {"$gt": comments_match.group(1)}})
-                        query_dict = {"$and": conditions} if conditions else {}
-                    else:
-                        # Processing single condition query
-                        query_dict = eval(condition) if condition else {}
-                    
-                    # Execute query
-                    if limit:
-                        results = list(self.db[collection_name].find(query_dict, projection).limit(limit))
-                    else:
-                        results = list(self.db[collection_name].find(query_dict, projection))
-
-
-                    print(cf.success(f"\nFound {len(results)} documents"))
+                    # Execute query, printing documents as they arrive
                     print(cf.separator())
-                    for result in results:
+                    found = 0
+                    for result in self._stream_plan(plan, command):
+                        found += 1
+                        name = result.get("name") or ""
                         formatted_result = {
-                            "Name": result["name"][:50] + "..." if len(result["name"]) > 50 else result["name"],
-                            "Rating": self.format_value(result["ratings"], "ratings"),
-                            "Reviews": self.format_value(result["no_of_ratings"], "no_of_ratings"),
-                            "Price": self.format_value(result["discount_price"], "discount_price"),
-                            "Original": self.format_value(result["actual_price"], "actual_price")
+                            "Name": name[:50] + "..." if len(name) > 50 else name,
+                            "Rating": self.format_value(result.get("ratings"), "ratings"),
+                            "Reviews": self.format_value(result.get("no_of_ratings"), "no_of_ratings"),
+                            "Price": self.format_value(result.get("discount_price"), "discount_price"),
+                            "Original": self.format_value(result.get("actual_price"), "actual_price")
                         }
+                        if plan.join_mode == "count" and plan.joins:
+                            formatted_result["Related"] = {join.table: result.get(f"{join.table}_count") for join in plan.joins}
                         print(cf.highlight(formatted_result))
                     print(cf.separator())
+                    print(cf.success(f"Found {found} documents"))
 
                 except Exception as e:
                     print(cf.warning("\nSorry, my natural language model may have misunderstood your meaning! You can try these examples："))
@@ -422,7 +809,7 @@ class NoSQLDatabaseHandler:
 
         except Exception as e:
             print(cf.warning("\Sorry, my natural language model may have misunderstood you! You can try these examples"))
-            if group_by:
+            if plan.group_by:
                 print(cf.highlight("• show total number of appliances group by category"))
                 print(cf.highlight("• show average rating for air conditioners group by category"))
             else:
@@ -447,12 +834,12 @@ class NoSQLDatabaseHandler:
                 return "modify"
             elif choice == "2":
                 template = f"show me {collection_name.replace('_', ' ')}"
-                if condition:
+                if plan.predicates:
                     template += " with similar conditions"
-                if order_by:
+                if plan.sort:
                     template += " and sorting"
-                if limit != 5:
-                    template += f" limit {limit} records"
+                if plan.limit != 5:
+                    template += f" limit {plan.limit} records"
                 print(cf.info(f"\nTemplate: {template}"))
                 print(cf.info("Please enter your similar query:"))
                 return "similar"
@@ -474,13 +861,14 @@ class NoSQLDatabaseHandler:
                 export_data = {
                     "query_info": {
                         "collection": collection_name,
-                        "condition": condition if condition else "None",
-                        "group_by": group_by if group_by else "None",
-                        "aggregate": aggregate if aggregate else "None",
-                        "limit": limit
+                        "condition": command.get("filter") or "None",
+                        "group_by": plan.group_by if plan.group_by else "None",
+                        "aggregate": [agg.alias for agg in plan.aggregates] or "None",
+                        "sort": command.get("sort") or "None",
+                        "limit": plan.limit
                     },
                     "mongodb_query": {
-                        "pipeline": pipeline if 'pipeline' in locals() else [],
+                        "pipeline": command.get("pipeline", []),
                         "explanation": explanation
                     }
                 }
@@ -0,0 +1,141 @@
+from dataclasses import dataclass
+from typing import Optional, Tuple, Union
+
+
+@dataclass(frozen=True)
+class Predicate:
+    """Comparison of a column with a number; `between` takes a (low, high) tuple"""
+    field: str
+    op: str
+    value: Union[int, float, Tuple[Union[int, float], Union[int, float]]]
+
+
+@dataclass(frozen=True)
+class Sort:
+    """Sort key of a plain query"""
+    field: str
+    descending: bool = False
+
+
+@dataclass(frozen=True)
+class Aggregate:
+    """Aggregate computed per group; `field` is None for count"""
+    func: str
+    field: Optional[str]
+    alias: str
+
+
+@dataclass(frozen=True)
+class Join:
+    """Join of the plan's table with another table on a shared category column"""
+    table: str
+    join_type: str
+    on: str
+
+
+@dataclass(frozen=True)
+class QueryPlan:
+    """
+    Backend independent description of a parsed question.
+
+    Every field is immutable, so plans can be compared and used as
+    dictionary keys (e.g. for caching compiled queries).
+
+    `join_mode` selects what a join returns: "rows" for every joined row,
+    "semi" for the rows of `table` that have related rows, or "count" for
+    the rows of `table` with the number of related rows per join.
+
+    `totals` adds a row with the aggregates over all groups to a group-by;
+    result rows then carry `is_total` (1 for that row, 0 otherwise).
+    """
+    table: str
+    predicates: Tuple[Predicate, ...] = ()
+    sort: Optional[Sort] = None
+    limit: Optional[int] = None
+    group_by: Optional[str] = None
+    aggregates: Tuple[Aggregate, ...] = ()
+    joins: Tuple[Join, ...] = ()
+    join_mode: str = "rows"
+    totals: bool = False
+
+    @property
+    def tables(self):
+        """Names of every table the plan reads"""
+        return (self.table,) + tuple(join.table for join in self.joins)
+
+    @property
+    def columns(self):
+        """
+        Columns returned by a plain query: the displayed columns plus those
+        the plan filters or sorts on, so exported rows show why they matched.
+        """
+        columns = list(DISPLAY_COLUMNS)
+        fields = [predicate.field for predicate in self.predicates]
+        if self.sort:
+            fields.append(self.sort.field)
+        for field in fields:
+            if field not in columns:
+                columns.append(field)
+        return tuple(columns)
+
+    @property
+    def summary_columns(self):
+        """
+        Summary columns holding this plan's aggregates, or None when the
+        plan filters or joins and must aggregate the table itself.
+        """
+        if self.group_by not in SUMMARY_GROUPS or self.predicates or self.joins or self.totals:
+            return None
+        columns = tuple(SUMMARY_COLUMNS.get((agg.func, agg.field)) for agg in self.aggregates)
+        return None if None in columns else columns
+
+
+# Columns shown for each row of a plain query
+DISPLAY_COLUMNS = ("name", "ratings", "no_of_ratings", "discount_price", "actual_price")
+
+
+# Values of QueryPlan.join_mode
+JOIN_MODES = ("rows", "semi", "count")
+
+# Joins estimated to return more rows than this run as "count related" instead
+MAX_JOIN_ROWS = 100000
+
+# Columns of the queried table returned by join queries
+JOIN_COLUMNS = ["name", "ratings", "no_of_ratings", "discount_price", "actual_price"]
+
+# Columns the import-time category summaries are grouped by
+SUMMARY_GROUPS = ("sub_category", "main_category")
+
+# Aggregate (func, field) -> column of the category summary that holds it
+SUMMARY_COLUMNS = {
+    ("count", None): "row_count",
+    ("avg", "numeric_rating"): "avg_rating",
+    ("min", "numeric_rating"): "min_rating",
+    ("max", "numeric_rating"): "max_rating",
+    ("sum", "numeric_no_of_ratings"): "total_reviews",
+    ("avg", "numeric_price"): "avg_price",
+    ("min", "numeric_price"): "min_price",
+    ("max", "numeric_price"): "max_price",
+}
+
+# Aggregates understood by the parser
+COUNT = Aggregate("count", None, "count")
+AVG_RATING = Aggregate("avg", "numeric_rating", "average_rating")
+MIN_RATING = Aggregate("min", "numeric_rating", "min_rating")
+MAX_RATING = Aggregate("max", "numeric_rating", "max_rating")
+TOTAL_REVIEWS = Aggregate("sum", "numeric_no_of_ratings", "total_reviews")
+AVG_PRICE = Aggregate("avg", "numeric_price", "average_price")
+MIN_PRICE = Aggregate("min", "numeric_price", "min_price")
+MAX_PRICE = Aggregate("max", "numeric_price", "max_price")
+
+# Labels used when printing aggregate results
+AGGREGATE_LABELS = {
+    "count": "Count",
+    "average_rating": "Average Rating",
+    "min_rating": "Min Rating",
+    "max_rating": "Max Rating",
+    "total_reviews": "Total Reviews",
+    "average_price": "Average Price",
+    "min_price": "Min Price",
+    "max_price": "Max Price",
+}
@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache of query results with a time-to-live.
+
+    Entries are keyed by the final query text and remember which tables
+    they read, so reloading a table can drop exactly the results that
+    depend on it. Streamed results with more than `max_rows` rows are
+    not kept, which bounds the memory held by the cache, and neither are
+    results of streams that an invalidation overlapped, which may have
+    read a table half reloaded.
+    """
+
+    def __init__(self, max_entries=256, ttl=300, max_rows=1000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Number of invalidate() calls, read by streams to spot one made while they ran
+        self._generation = 0
+
+    def get(self, key):
+        """Return (True, results) for a fresh entry, otherwise (False, None)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                results, tables, stored_at = entry
+                if time.monotonic() - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, results
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, results, tables):
+        """Store the results of a query that read the given tables"""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (results, frozenset(tables), time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stream(self, key, tables, produce):
+        """
+        Yield the cached rows of `key`, or the rows of `produce()` as they
+        arrive. A result is stored only if it was read to the end, has at
+        most `max_rows` rows and no invalidation happened meanwhile.
+        """
+        hit, results = self.get(key)
+        if hit:
+            yield from results
+            return
+        generation = self._generation
+        kept = [] if self.max_entries > 0 else None
+        for row in produce():
+            if kept is not None:
+                kept.append(row)
+                if len(kept) > self.max_rows:
+                    kept = None
+            yield row
+        if kept is not None and self._generation == generation:
+            self.put(key, kept, tables)
+
+    def invalidate(self, table=None):
+        """Drop every entry that read `table`, or everything when no table is given"""
+        with self._lock:
+            self._generation += 1
+            if table is None:
+                stale = list(self._entries)
+            else:
+                stale = [key for key, (_, tables, _) in self._entries.items() if table in tables]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def stats(self):
+        """Return cache statistics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "max_rows": self.max_rows,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -1,3 +1,4 @@
+import csv
 import os
 import pandas as pd
 import mysql.connector
@@ -6,22 +7,244 @@ from tabulate import tabulate
 import random
 from datetime import datetime
 import re
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import replace
+from connection_pool import ConnectionPool
+from column_cache import file_hash, load_frame
+from csv_reader import LINK_COLUMNS, ROW_KEY_COLUMNS, CSVReader, add_row_keys, max_lengths
+from data_utils import NUMERIC_COLUMNS
+from query_plan import AGGREGATE_LABELS, JOIN_COLUMNS, MAX_JOIN_ROWS, SUMMARY_GROUPS
+from result_cache import ResultCache
 
+# SQL types of the numeric columns stored next to the display strings
+NUMERIC_COLUMN_TYPES = {
+    "numeric_rating": "DECIMAL(3,1)",
+    "numeric_no_of_ratings": "INT",
+    "numeric_price": "DECIMAL(12,2)",
+    "numeric_actual_price": "DECIMAL(12,2)",
+}
+
+# Rows fetched per round trip when streaming results
+FETCH_SIZE = 500
+
+# Secondary indexes built after each table is loaded. The composite indexes
+# also serve lookups on their leading column (sub_category, main_category).
+TABLE_INDEXES = {
+    "sub_category_rating": ["sub_category", "numeric_rating"],
+    "main_category_sub_category": ["main_category", "sub_category"],
+    "rating": ["numeric_rating"],
+    "reviews": ["numeric_no_of_ratings"],
+    "price": ["numeric_price"],
+}
+
+# Per-category aggregates refreshed at import, the import each table last
+# completed, the CSV file each table was last loaded or synced from, and
+# the progress of imports that have not finished. Summary rows are only
+# used while their import_id matches. The DDL is valid for both MySQL and
+# SQLite.
+SUMMARY_TABLES = [
+    """CREATE TABLE IF NOT EXISTS import_metadata (
+        table_name VARCHAR(64) PRIMARY KEY,
+        import_id VARCHAR(32) NOT NULL,
+        row_count BIGINT NOT NULL,
+        imported_at DATETIME NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS category_summary (
+        table_name VARCHAR(64) NOT NULL,
+        group_column VARCHAR(32) NOT NULL,
+        category VARCHAR(255),
+        import_id VARCHAR(32) NOT NULL,
+        row_count BIGINT NOT NULL,
+        avg_rating DOUBLE,
+        min_rating DOUBLE,
+        max_rating DOUBLE,
+        total_reviews BIGINT,
+        avg_price DOUBLE,
+        min_price DOUBLE,
+        max_price DOUBLE
+    )""",
+    """CREATE TABLE IF NOT EXISTS import_manifest (
+        table_name VARCHAR(64) PRIMARY KEY,
+        source_hash CHAR(64) NOT NULL,
+        column_list TEXT NOT NULL,
+        row_count BIGINT NOT NULL,
+        synced_at DATETIME NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS import_checkpoint (
+        table_name VARCHAR(64) PRIMARY KEY,
+        source_hash CHAR(64) NOT NULL,
+        column_list TEXT NOT NULL,
+        rows_done BIGINT NOT NULL,
+        rows_rejected BIGINT NOT NULL,
+        loaded BOOLEAN NOT NULL DEFAULT 0,
+        updated_at DATETIME NOT NULL
+    )""",
+]
+
+# SQL types of the columns add_row_keys adds
+ROW_KEY_COLUMN_TYPES = {
+    "row_key": "VARCHAR(64)",
+    "row_hash": "CHAR(16)",
+}
+
+# Rows per DELETE statement when a sync removes rows
+DELETE_BATCH_SIZE = 500
+
+# Rows loaded between commits of an import; each commit records the progress
+CHECKPOINT_ROWS = 50000
+
+# Directory, next to the data folder, of the rows imports could not insert
+REJECTS_DIR_NAME = "rejected_rows"
+
+def rejects_path_for(file_path):
+    """Side file of the rows rejected while importing a CSV file, under rejected_rows/ next to its folder"""
+    folder = os.path.dirname(os.path.abspath(file_path))
+    stem = os.path.splitext(os.path.basename(file_path))[0].replace(" ", "_")
+    return os.path.join(os.path.dirname(folder), REJECTS_DIR_NAME, f"{stem}.csv")
+
+
+class RejectedRows:
+    """
+    CSV file of the rows an import could not insert: their row number in the
+    source file, their values and the database error. The file is created
+    on the first rejection. A resumed import appends to it; a new one
+    replaces it.
+    """
+
+    def __init__(self, path, column_names, append=False):
+        self.path = path
+        self.column_names = column_names
+        self.file = None
+        self.writer = None
+        if not append and os.path.exists(path):
+            os.remove(path)
+
+    def write(self, row_number, row, error):
+        if self.writer is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            new_file = not os.path.exists(self.path)
+            self.file = open(self.path, "a", encoding="utf-8", newline="")
+            self.writer = csv.writer(self.file)
+            if new_file:
+                self.writer.writerow(["row", *self.column_names, "error"])
+        self.writer.writerow([row_number, *row, str(error)])
+
+    def flush(self):
+        if self.file:
+            self.file.flush()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+            self.writer = None
+
+
+def _timed_load_frame(file_path, drop_columns=()):
+    """Load a CSV with row keys, drop `drop_columns`, and return the frame and the seconds it took"""
+    start = time.perf_counter()
+    df = add_row_keys(load_frame(file_path))
+    df = df.drop(columns=[col for col in drop_columns if col in df.columns])
+    return df, time.perf_counter() - start
 
 class SQLDatabaseHandler:
-    def __init__(self, host, port, user, password, database):
+    # Parameter marker and base exception class of the DB-API driver
+    placeholder = "%s"
+    database_error = mysql.connector.Error
+
+    def __init__(self, host, port, user, password, database, pool_size=5, pool_timeout=30,
+                 health_check_interval=30, cache_size=256, cache_ttl=300, max_join_rows=MAX_JOIN_ROWS):
         self.host = host
         self.port = port
         self.user = user
         self.password = password
         self.database = database
+        # Connections to `database` are shared across queries and imports
+        self.pool = ConnectionPool(
+            pool_size=pool_size,
+            timeout=pool_timeout,
+            health_check_interval=health_check_interval,
+            host=host,
+            port=port,
+            user=user,
+            password=password,
+            database=database
+        )
+        # Results of generated queries, dropped when their tables are reloaded
+        self.result_cache = ResultCache(max_entries=cache_size, ttl=cache_ttl)
+        self.max_join_rows = max_join_rows
+
+    def get_stats(self):
+        """Return runtime statistics of this handler"""
+        return {
+            "connection_pool": self.pool.stats(),
+            "result_cache": self.result_cache.stats(),
+        }
+
+    def close(self):
+        """Close the idle pooled connections"""
+        self.pool.close()
+
+    @contextmanager
+    def _import_connection(self, use_load_data):
+        """
+        Connection used to load tables. LOAD DATA LOCAL INFILE needs local
+        infile enabled at connect time, so that mode gets its own connection
+        instead of one from the shared pool.
+        """
+        if not use_load_data:
+            with self.pool.connection() as connection:
+                yield connection
+            return
+        connection = mysql.connector.connect(
+            host=self.host,
+            port=self.port,
+            user=self.user,
+            password=self.password,
+            database=self.database,
+            allow_local_infile=True
+        )
+        try:
+            yield connection
+        finally:
+            connection.close()
 
-    def create_database_and_tables(self, folder_path, selected_files):
+    def create_database_and_tables(self, folder_path, selected_files, batch_size=5000, use_load_data=False,
+                                   create_indexes=True, workers=1, drop_links=False,
+                                   checkpoint_rows=CHECKPOINT_ROWS, resume=True, parse_whole=False):
         """
         Create database and import selected CSV files as tables.
+
+        Rows are sent in batches of `batch_size` with one multi-row INSERT per
+        batch. With `use_load_data=True` the CSV is streamed to the server
+        with LOAD DATA LOCAL INFILE instead, falling back to batched inserts
+        if the server refuses local infile.
+
+        Batched inserts are committed every `checkpoint_rows` rows along with
+        each table's progress, so an import that crashes or loses the server
+        resumes after its last checkpoint when run again (`resume=False`
+        starts over). Rows the database refuses are written to
+        rejected_rows/<file>.csv instead of failing their batch.
+
+        Each CSV is streamed in chunks of `batch_size` rows, and column
+        types are sized from a first pass over it in chunks. Pass
+        `drop_links=True` to leave out the image and link columns.
+
+        Secondary indexes on the filter, sort and join keys are built after the
+        rows are loaded; pass `create_indexes=False` to skip them for
+        write-heavy reloads.
+
+        With `workers` > 1 up to `workers` tables (at most the connection pool
+        size) are loaded at once, each streamed in chunks over its own
+        connection. `parse_whole=True` instead parses the CSVs whole in a pool
+        of that many processes, which is faster but holds every file in memory.
         """
         print(cf.header("DATABASE IMPORT PROCESS"))
         
+        # The pool connects to the database itself, so create it first
         connection = mysql.connector.connect(
             host=self.host,
             port=self.port,
@@ -32,65 +255,465 @@ class SQLDatabaseHandler:
         
         print(f"\n{cf.info('Creating database:')} {cf.highlight(self.database)}")
         cursor.execute(f"CREATE DATABASE IF NOT EXISTS {self.database}")
-        cursor.execute(f"USE {self.database}")
+        connection.close()
 
-        for file in selected_files:
-            file_path = os.path.join(folder_path, file)
-            table_name = file.replace(" ", "_").replace(".csv", "").lower()
-            
-            print(f"\n{cf.info('Processing file:')} {cf.highlight(file)}")
+        drop_columns = LINK_COLUMNS if drop_links else ()
+        start = time.perf_counter()
+        if workers > 1 and len(selected_files) > 1:
+            results = self._import_parallel(folder_path, selected_files, batch_size, use_load_data,
+                                            create_indexes, workers, drop_columns, checkpoint_rows, resume,
+                                            parse_whole)
+        else:
+            results = []
+            with self._import_connection(use_load_data) as connection:
+                for file in selected_files:
+                    print(f"\n{cf.info('Processing file:')} {cf.highlight(file)}")
+                    reader = CSVReader(os.path.join(folder_path, file), chunk_rows=batch_size,
+                                       drop_columns=drop_columns, row_keys=True)
+                    result = self._import_table(connection, reader, batch_size, use_load_data, create_indexes,
+                                                checkpoint_rows=checkpoint_rows, resume=resume)
+                    results.append({**result, "parse_seconds": reader.read_seconds})
+        elapsed = time.perf_counter() - start
+
+        print(f"\n{cf.success(f'Successfully imported all files into SQL database `{self.database}`')}")
+        self._print_import_summary(results, elapsed)
+
+    def _import_parallel(self, folder_path, selected_files, batch_size, use_load_data, create_indexes, workers,
+                         drop_columns, checkpoint_rows, resume, parse_whole):
+        """Load each table over its own connection, streaming its CSV in chunks or parsing it whole in a process"""
+        # Every loader holds a connection for its whole table; LOAD DATA opens its own
+        loaders = workers if use_load_data else min(workers, self.pool.pool_size)
+
+        def load(file_path, frame=None):
+            reader = CSVReader(file_path, chunk_rows=batch_size, drop_columns=drop_columns, row_keys=True)
+            df, parse_seconds = frame.result() if frame else (None, None)
+            with self._import_connection(use_load_data) as connection:
+                result = self._import_table(connection, reader, batch_size, use_load_data, create_indexes, df=df,
+                                            verbose=False, checkpoint_rows=checkpoint_rows, resume=resume)
+            rate = result["rows"] / result["load_seconds"] if result["load_seconds"] > 0 else 0
+            print(cf.success(f"{result['table']}: {result['rows']} records in {result['load_seconds']:.2f}s "
+                             f"({rate:,.0f} rows/sec)"))
+            return {**result, "parse_seconds": reader.read_seconds if frame is None else parse_seconds}
+
+        file_paths = [os.path.join(folder_path, file) for file in selected_files]
+        if not parse_whole:
+            print(cf.info(f"Importing {len(selected_files)} files in chunks over {loaders} loader connections"))
+            with ThreadPoolExecutor(max_workers=loaders) as loader_pool:
+                futures = [loader_pool.submit(load, file_path) for file_path in file_paths]
+                # Tables committed before a failure stay imported
+                return [future.result() for future in futures]
+
+        parser_count = min(workers, len(selected_files))
+        print(cf.info(f"Importing {len(selected_files)} files with {parser_count} parser processes "
+                      f"and {loaders} loader connections"))
+        with ProcessPoolExecutor(max_workers=parser_count) as parsers, ThreadPoolExecutor(max_workers=loaders) as loader_pool:
+            frames = [parsers.submit(_timed_load_frame, file_path, drop_columns) for file_path in file_paths]
+            futures = [loader_pool.submit(load, file_path, frame) for file_path, frame in zip(file_paths, frames)]
+            # Tables committed before a failure stay imported
+            return [future.result() for future in futures]
+
+    def _import_table(self, connection, reader, batch_size, use_load_data, create_indexes, df=None, verbose=True,
+                      checkpoint_rows=CHECKPOINT_ROWS, resume=True):
+        """
+        Create one table from the CSV file of a CSVReader, commit it and
+        refresh its category summary. Rows come from the reader's chunks, or
+        from `df` when the file was already parsed whole; both carry the row
+        keys later syncs compare against.
+
+        Rows are committed every `checkpoint_rows` rows together with the
+        number of rows done in import_checkpoint. An import of the same file
+        that stopped part-way is resumed after its last checkpoint instead of
+        dropping the table, unless `resume=False`. Rows the database refuses
+        are written to a side file under rejected_rows/. Returns the table's
+        inserted and rejected row counts and load time.
+        """
+        file_path = reader.file_path
+        table_name = os.path.basename(file_path).replace(" ", "_").replace(".csv", "").lower()
+        cursor = connection.cursor()
+        if verbose:
             print(f"{cf.info('Table name:')} {cf.highlight(table_name)}")
-            
-            df = pd.read_csv(file_path)
-            print(f"{cf.info('Records read from CSV:')} {cf.highlight(len(df))}")
 
-            # Drop table if it exists
-            cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+        source_hash = file_hash(file_path)
+        output_columns = reader.output_columns()
+        for statement in SUMMARY_TABLES:
+            cursor.execute(statement)
+        checkpoint = self._load_checkpoint(cursor, table_name, source_hash, output_columns) if resume else None
 
-            # Add the id field as the primary key
-            columns = ["id INT AUTO_INCREMENT PRIMARY KEY"]  
-            
-            # Dynamically determine column types
-            def determine_column_type(column):
-                max_length = df[column].astype(str).map(len).max()
-                if max_length <= 255:
-                    return f"{column.replace(' ', '_')} VARCHAR(255)"
-                elif max_length <= 65535:
-                    return f"{column.replace(' ', '_')} TEXT"
-                else:
-                    return f"{column.replace(' ', '_')} LONGTEXT"
+        # Mark the summary and the sync manifest stale before the rows change
+        cursor.execute(f"DELETE FROM import_metadata WHERE table_name = '{table_name}'")
+        cursor.execute(f"DELETE FROM import_manifest WHERE table_name = '{table_name}'")
+        self.result_cache.invalidate(table_name)
 
-            columns.extend([determine_column_type(col) for col in df.columns])
+        # Determine column types from the longest value of each column in the
+        # whole file. VARCHAR counts characters; TEXT holds 65535 bytes, which
+        # is 16383 characters of up to four bytes in utf8mb4
+        def determine_column_type(column, max_length):
+            if max_length <= 255:
+                return f"{column.replace(' ', '_')} VARCHAR(255)"
+            elif max_length * 4 <= 65535:
+                return f"{column.replace(' ', '_')} TEXT"
+            else:
+                return f"{column.replace(' ', '_')} LONGTEXT"
+
+        # Numeric copies of ratings, review counts and prices (added by the
+        # reader) let queries filter and sort without casting the display strings
+        file_columns = reader.columns()
+        csv_columns = [col.replace(' ', '_') for col in file_columns]
+        numeric_columns = [numeric for col, numeric in NUMERIC_COLUMNS.items() if col in file_columns]
+        column_names = csv_columns + numeric_columns + ROW_KEY_COLUMNS
+
+        if checkpoint and checkpoint[2]:
+            start_row, rejected_before, loaded = checkpoint
+            print(cf.warning(f"Finishing {table_name}, whose rows an earlier import already loaded"))
+        elif checkpoint:
+            start_row, rejected_before, loaded = checkpoint
+            print(cf.warning(f"Resuming {table_name} after row {start_row}, where an earlier import stopped"))
+            # Keys of the rows already loaded, so that repeated links get the same suffixes
+            cursor.execute(f"SELECT row_key FROM {table_name}")
+            reader.seen_keys = {key for key, in cursor.fetchall()}
+            reader.start_row = start_row
+        else:
+            start_row, rejected_before, loaded = 0, 0, False
+            # Add the id field as the primary key. A file parsed whole is measured
+            # in memory; otherwise the reader makes a pass over it in chunks
+            lengths = max_lengths(df, file_columns) if df is not None else reader.max_lengths()
+            columns = ["id INT AUTO_INCREMENT PRIMARY KEY"]
+            columns.extend([determine_column_type(col, lengths[col]) for col in file_columns])
+            columns.extend([f"{col} {NUMERIC_COLUMN_TYPES[col]}" for col in numeric_columns])
+            columns.extend([f"{col} {ROW_KEY_COLUMN_TYPES[col]}" for col in ROW_KEY_COLUMNS])
             columns_str = ", ".join(columns)
-            
-            print(f"{cf.info('Creating table with columns:')}\n{cf.highlight(columns_str)}")
+            # Drop table if it exists
+            cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+            if verbose:
+                print(f"{cf.info('Creating table with columns:')}\n{cf.highlight(columns_str)}")
             cursor.execute(f"CREATE TABLE {table_name} ({columns_str})")
+            for statement in self.checkpoint_statements(table_name, source_hash, output_columns, 0, 0):
+                cursor.execute(statement)
+            connection.commit()
+        rejects = RejectedRows(rejects_path_for(file_path), column_names, append=checkpoint is not None)
+        checkpoints = []
+
+        def save_checkpoint(rows_done, rows_rejected):
+            # The rows and the progress that covers them are committed together
+            rejects.flush()
+            for statement in self.checkpoint_statements(table_name, source_hash, output_columns, rows_done,
+                                                        rejected_before + rows_rejected):
+                cursor.execute(statement)
+            connection.commit()
+            checkpoints.append(rows_done)
+            if verbose:
+                print(cf.info(f"  Checkpoint: {rows_done:,} rows committed"), end="\r", flush=True)
 
-            # Insert data into the table
+        # Insert data into the table. LOAD DATA leaves the row keys empty, so
+        # such a table has no manifest and its next sync imports it in full
+        start = time.perf_counter()
+        records_inserted = None
+        rejected = 0
+        if loaded:
             records_inserted = 0
-            for _, row in df.iterrows():
+            cursor.execute(f"SELECT COUNT(*) FROM {table_name} WHERE row_key IS NULL")
+            keyed = rejected_before == 0 and cursor.fetchall()[0][0] == 0
+        else:
+            if use_load_data and not checkpoint:
+                records_inserted = self._load_data_infile(cursor, file_path, table_name, reader.header(),
+                                                          csv_columns, numeric_columns)
+            keyed = records_inserted is None
+            if keyed:
+                chunks = [df.iloc[start_row:]] if df is not None else reader
                 try:
-                    escaped_values = []
-                    for val in row:
-                        if pd.isna(val):
-                            escaped_values.append("NULL")
-                        else:
-                            escaped_val = str(val).replace("'", "''")
-                            escaped_values.append(f"'{escaped_val}'")
-                    values = ", ".join(escaped_values)
-                    # Modify the insert statement to exclude the id field (it will be auto-generated).
-                    query = f"INSERT INTO {table_name} ({', '.join(df.columns)}) VALUES ({values})"
-                    cursor.execute(query)
-                    records_inserted += 1
-                except Exception as e:
-                    print(cf.error(f"Failed to insert row: {e}"))
-                    continue
+                    records_inserted, rejected = self._insert_batches(connection, cursor, chunks, table_name,
+                                                                      column_names, batch_size, rejects, start_row,
+                                                                      checkpoint_rows, save_checkpoint)
+                finally:
+                    rejects.close()
+                # Rejected rows leave the table incomplete
+                keyed = rejected_before + rejected == 0
+            # The last rows are committed with a checkpoint saying they are all in, so
+            # an import that stops while building indexes does not load them again
+            for statement in self.checkpoint_statements(table_name, source_hash, output_columns,
+                                                        start_row + records_inserted + rejected,
+                                                        rejected_before + rejected, loaded=True):
+                cursor.execute(statement)
+        connection.commit()
+        elapsed = time.perf_counter() - start
 
-            print(cf.success(f"Successfully inserted {records_inserted} records"))
+        if verbose and checkpoints:
+            print()
+        if verbose:
+            rate = records_inserted / elapsed if elapsed > 0 else 0
+            print(cf.success(f"Successfully inserted {records_inserted} records in {elapsed:.2f}s ({rate:,.0f} rows/sec)"))
+        if rejected_before + rejected:
+            print(cf.warning(f"{table_name}: {rejected_before + rejected} rows rejected, see {rejects.path}"))
 
+        # Syncs look rows up by key whether or not the other indexes are built
+        try:
+            cursor.execute(f"CREATE UNIQUE INDEX idx_{table_name}_row_key ON {table_name} (row_key)")
+        except self.database_error as e:
+            # e.g. already built by an import that stopped while refreshing the summary
+            print(cf.warning(f"Could not create index idx_{table_name}_row_key: {e}"))
+        if create_indexes:
+            self._create_indexes(cursor, table_name, csv_columns + numeric_columns)
+
+        for statement in self.summary_statements(table_name):
+            cursor.execute(statement)
+        if keyed:
+            for statement in self.manifest_statements(table_name, source_hash, output_columns,
+                                                      start_row + records_inserted):
+                cursor.execute(statement)
+        cursor.execute(f"DELETE FROM import_checkpoint WHERE table_name = '{table_name}'")
         connection.commit()
-        connection.close()
-        print(f"\n{cf.success(f'Successfully imported all files into SQL database `{self.database}`')}")
+        # Results cached by queries that ran during the import may be partial
+        self.result_cache.invalidate(table_name)
+        if verbose:
+            print(cf.success(f"Refreshed category summary of {table_name}"))
+        return {"table": table_name, "rows": records_inserted, "rejected": rejected_before + rejected,
+                "load_seconds": elapsed}
+
+    def _load_checkpoint(self, cursor, table_name, source_hash, columns):
+        """
+        Rows done and rejected by an unfinished import of the same file and
+        columns, and whether all its rows were loaded, or None when the table
+        has to be imported from the start
+        """
+        cursor.execute(f"""
+            SELECT rows_done, rows_rejected, loaded FROM import_checkpoint
+            WHERE table_name = '{table_name}' AND source_hash = '{source_hash}' AND column_list = '{",".join(columns)}'
+        """)
+        rows = cursor.fetchall()
+        return (rows[0][0], rows[0][1], bool(rows[0][2])) if rows else None
+
+    def checkpoint_statements(self, table_name, source_hash, columns, rows_done, rows_rejected, loaded=False):
+        """
+        Statements that record how far the import of a table has got;
+        `loaded` marks that every row is in and only indexes and the summary
+        are left
+        """
+        updated_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        return [
+            f"DELETE FROM import_checkpoint WHERE table_name = '{table_name}'",
+            f"""
+                INSERT INTO import_checkpoint (table_name, source_hash, column_list, rows_done, rows_rejected, loaded,
+                                               updated_at)
+                VALUES ('{table_name}', '{source_hash}', '{",".join(columns)}', {rows_done}, {rows_rejected},
+                        {int(loaded)}, '{updated_at}')
+            """,
+        ]
+
+    def _print_import_summary(self, results, elapsed):
+        """Print per-table and total import throughput"""
+        rows = [
+            [result["table"], result["rows"], result["rejected"], result["parse_seconds"], result["load_seconds"],
+             f"{result['rows'] / result['load_seconds']:,.0f}" if result["load_seconds"] > 0 else "-"]
+            for result in results
+        ]
+        print(tabulate(rows, headers=["Table", "Rows", "Rejected", "Parse (s)", "Load (s)", "Rows/sec"],
+                       floatfmt=".2f"))
+        total = sum(result["rows"] for result in results)
+        rate = total / elapsed if elapsed > 0 else 0
+        print(cf.info(f"Total: {total} records in {elapsed:.2f}s ({rate:,.0f} rows/sec)"))
+
+    def sync_tables(self, folder_path, selected_files, batch_size=5000, drop_links=False):
+        """
+        Bring imported tables up to date with their CSV files by applying
+        only the rows that changed since the last import or sync.
+
+        A file whose content hash matches import_manifest is skipped. Otherwise
+        its rows are matched on row_key: new keys are inserted, keys whose
+        row_hash differs are updated and keys no longer in the file are
+        deleted, in one transaction per table. Tables without a manifest
+        (never imported, loaded with LOAD DATA, or imported with other
+        columns) are imported in full.
+        """
+        print(cf.header("DATABASE SYNC PROCESS"))
+        drop_columns = LINK_COLUMNS if drop_links else ()
+        start = time.perf_counter()
+        results = []
+        full_imports = []
+        with self._import_connection(False) as connection:
+            for file in selected_files:
+                print(f"\n{cf.info('Processing file:')} {cf.highlight(file)}")
+                reader = CSVReader(os.path.join(folder_path, file), chunk_rows=batch_size,
+                                   drop_columns=drop_columns, row_keys=True)
+                result = self._sync_table(connection, reader, batch_size)
+                if result is None:
+                    print(cf.warning("No sync manifest for this table, it will be imported in full"))
+                    full_imports.append(file)
+                else:
+                    results.append(result)
+        elapsed = time.perf_counter() - start
+
+        if results:
+            rows = [[result["table"], result["inserted"], result["updated"], result["deleted"], result["seconds"]]
+                    for result in results]
+            print(tabulate(rows, headers=["Table", "Inserted", "Updated", "Deleted", "Time (s)"], floatfmt=".2f"))
+            changes = sum(result["inserted"] + result["updated"] + result["deleted"] for result in results)
+            print(cf.info(f"Total: {changes} changed records in {elapsed:.2f}s"))
+        if full_imports:
+            self.create_database_and_tables(folder_path, full_imports, batch_size=batch_size, drop_links=drop_links)
+
+    def _sync_table(self, connection, reader, batch_size):
+        """
+        Apply the difference between a CSVReader's file and its table and
+        commit it. Returns the rows inserted, updated and deleted, or None
+        when the table has no usable manifest.
+        """
+        table_name = os.path.basename(reader.file_path).replace(" ", "_").replace(".csv", "").lower()
+        columns = reader.output_columns()
+        cursor = connection.cursor()
+        for statement in SUMMARY_TABLES:
+            cursor.execute(statement)
+        cursor.execute(f"SELECT source_hash, column_list FROM import_manifest WHERE table_name = '{table_name}'")
+        manifest = cursor.fetchall()
+        if not manifest or manifest[0][1] != ",".join(columns):
+            return None
+
+        start = time.perf_counter()
+        source_hash = file_hash(reader.file_path)
+        result = {"table": table_name, "inserted": 0, "updated": 0, "deleted": 0}
+        if manifest[0][0] == source_hash:
+            print(cf.info(f"{table_name} is unchanged"))
+            return {**result, "seconds": time.perf_counter() - start}
+
+        cursor.execute(f"SELECT row_key, row_hash FROM {table_name}")
+        existing = {key: row_hash for key, row_hash in cursor.fetchall()}
+        column_names = [col.replace(' ', '_') for col in columns]
+        update_columns = [col for col in columns if col != "row_key"]
+        placeholder = self.placeholder
+        insert_query = (f"INSERT INTO {table_name} ({', '.join(column_names)}) "
+                        f"VALUES ({', '.join([placeholder] * len(column_names))})")
+        assignments = ", ".join(f"{col.replace(' ', '_')} = {placeholder}" for col in update_columns)
+        update_query = f"UPDATE {table_name} SET {assignments} WHERE row_key = {placeholder}"
+
+        seen = set()
+        for df in reader:
+            previous = df["row_key"].map(existing)
+            new = previous.isna()
+            changed = ~new & (previous != df["row_hash"])
+            seen.update(df["row_key"])
+            if not (new.any() or changed.any()):
+                continue
+            # NaN becomes NULL; everything else is passed as a bound parameter
+            rows = df.astype(object).where(pd.notna(df), None)
+            if new.any():
+                cursor.executemany(insert_query, list(rows[new].itertuples(index=False, name=None)))
+            if changed.any():
+                cursor.executemany(update_query, list(rows.loc[changed, update_columns + ["row_key"]]
+                                                      .itertuples(index=False, name=None)))
+            result["inserted"] += int(new.sum())
+            result["updated"] += int(changed.sum())
+
+        removed = [key for key in existing if key not in seen]
+        for offset in range(0, len(removed), DELETE_BATCH_SIZE):
+            batch = removed[offset:offset + DELETE_BATCH_SIZE]
+            cursor.execute(f"DELETE FROM {table_name} WHERE row_key IN ({', '.join([placeholder] * len(batch))})",
+                           batch)
+        result["deleted"] = len(removed)
+
+        changes = result["inserted"] + result["updated"] + result["deleted"]
+        if changes:
+            for statement in self.summary_statements(table_name):
+                cursor.execute(statement)
+        row_count = len(existing) + result["inserted"] - result["deleted"]
+        for statement in self.manifest_statements(table_name, source_hash, columns, row_count):
+            cursor.execute(statement)
+        connection.commit()
+        if changes:
+            self.result_cache.invalidate(table_name)
+        elapsed = time.perf_counter() - start
+        print(cf.success(f"Applied {result['inserted']} inserts, {result['updated']} updates and "
+                         f"{result['deleted']} deletes in {elapsed:.2f}s"))
+        return {**result, "seconds": elapsed}
+
+    def _create_indexes(self, cursor, table_name, table_columns):
+        """Create the secondary indexes in TABLE_INDEXES whose columns exist in the table"""
+        start = time.perf_counter()
+        created = []
+        for suffix, index_columns in TABLE_INDEXES.items():
+            if not all(col in table_columns for col in index_columns):
+                continue
+            index_name = f"idx_{table_name}_{suffix}"
+            try:
+                cursor.execute(f"CREATE INDEX {index_name} ON {table_name} ({', '.join(index_columns)})")
+                created.append(index_name)
+            except mysql.connector.Error as e:
+                print(cf.warning(f"Could not create index {index_name}: {e}"))
+        elapsed = time.perf_counter() - start
+        print(cf.success(f"Created {len(created)} indexes in {elapsed:.2f}s: {', '.join(created)}"))
+
+    def _insert_batches(self, connection, cursor, chunks, table_name, column_names, batch_size, rejects,
+                        start_row=0, checkpoint_rows=None, on_checkpoint=None):
+        """
+        Insert the rows of a sequence of DataFrames, the file's rows from
+        `start_row` on, with one multi-row INSERT per batch. Returns the rows
+        inserted and rejected.
+
+        A batch the database refuses is retried row by row, and the rows that
+        still fail go to `rejects`. After every `checkpoint_rows` rows,
+        on_checkpoint(rows_done, rows_rejected) commits them.
+        """
+        placeholders = ", ".join([self.placeholder] * len(column_names))
+        insert_query = f"INSERT INTO {table_name} ({', '.join(column_names)}) VALUES ({placeholders})"
+
+        records_inserted = 0
+        rejected = 0
+        rows_done = start_row
+        last_checkpoint = start_row
+        for df in chunks:
+            # NaN becomes NULL; everything else is passed as a bound parameter
+            rows = list(df.astype(object).where(pd.notna(df), None).itertuples(index=False, name=None))
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                # The savepoint undoes whatever part of a failed batch was applied
+                if not connection.in_transaction:
+                    cursor.execute("BEGIN")
+                cursor.execute("SAVEPOINT import_batch")
+                try:
+                    cursor.executemany(insert_query, batch)
+                    records_inserted += len(batch)
+                except self.database_error:
+                    cursor.execute("ROLLBACK TO SAVEPOINT import_batch")
+                    for row_number, row in enumerate(batch, rows_done + 1):
+                        try:
+                            cursor.execute(insert_query, row)
+                            records_inserted += 1
+                        except self.database_error as e:
+                            rejects.write(row_number, row, e)
+                            rejected += 1
+                cursor.execute("RELEASE SAVEPOINT import_batch")
+                rows_done += len(batch)
+                if checkpoint_rows and rows_done - last_checkpoint >= checkpoint_rows:
+                    on_checkpoint(rows_done, rejected)
+                    last_checkpoint = rows_done
+        return records_inserted, rejected
+
+    def _load_data_infile(self, cursor, file_path, table_name, header, column_names, numeric_columns):
+        """Load a CSV file with LOAD DATA LOCAL INFILE; return None if the server refuses it"""
+        # Every field of the file is read into a variable; dropped columns are never assigned
+        variables = [f"@{col.replace(' ', '_')}" for col in header]
+        assignments = [f"{col} = NULLIF(@{col}, '')" for col in column_names]
+        # Derive the numeric columns on the server with the same rules as add_numeric_columns
+        for column, numeric_column in NUMERIC_COLUMNS.items():
+            if numeric_column in numeric_columns:
+                cleaned = f"TRIM(REPLACE(REPLACE(@{column}, '₹', ''), ',', ''))"
+                number_pattern = "^[0-9]+$" if NUMERIC_COLUMN_TYPES[numeric_column] == "INT" else "^[0-9]+(\\\\.[0-9]+)?$"
+                assignments.append(f"{numeric_column} = CASE WHEN {cleaned} REGEXP '{number_pattern}' THEN {cleaned} END")
+        assignments = ", ".join(assignments)
+        load_query = f"""
+            LOAD DATA LOCAL INFILE %s
+            INTO TABLE {table_name}
+            CHARACTER SET utf8mb4
+            FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"' ESCAPED BY ''
+            LINES TERMINATED BY '\\n'
+            IGNORE 1 LINES
+            ({', '.join(variables)})
+            SET {assignments}
+        """
+        try:
+            cursor.execute(load_query, (os.path.abspath(file_path),))
+            return cursor.rowcount
+        except mysql.connector.Error as e:
+            print(cf.warning(f"LOAD DATA LOCAL INFILE unavailable ({e}), falling back to batched inserts"))
+            return None
 
     def format_value(self, value, field_name):
         """Format value based on field type"""
@@ -113,6 +736,22 @@ class SQLDatabaseHandler:
         except (ValueError, AttributeError, TypeError):
             return '0'
 
+    def format_group(self, category, result, aggregates):
+        """Format one group-by result row"""
+        parts = [f"Category: {category}"]
+        for aggregate in aggregates:
+            value = result.get(aggregate.alias)
+            label = AGGREGATE_LABELS.get(aggregate.alias, aggregate.alias)
+            if value is None:
+                parts.append(f"{label}: -")
+            elif aggregate.func == "count":
+                parts.append(f"{label}: {value}")
+            elif aggregate.func == "sum":
+                parts.append(f"{label}: {int(value):,}")
+            else:
+                parts.append(f"{label}: {float(value):.2f}")
+        return ", ".join(parts)
+
     def get_random_sql_examples(self, table_name):
         """Get random SQL query examples based on current query type"""
         examples = [
@@ -129,7 +768,7 @@ class SQLDatabaseHandler:
                     sub_category, 
                     COUNT(*) as count
                     FROM {table_name}
-                    WHERE ratings > 4
+                    WHERE numeric_rating > 4
                     GROUP BY sub_category
                     ORDER BY count DESC""",
                 "explanation": "This query counts high-rated products (rating > 4) in each category."
@@ -137,18 +776,289 @@ class SQLDatabaseHandler:
             # Rating statistics example.
             {
                 "query": f"show me average ratings by category for {table_name.replace('_', ' ')}",
-                "sql": f"SELECT sub_category, AVG(ratings) AS average_rating FROM {table_name} GROUP BY sub_category ORDER BY average_rating DESC",
+                "sql": f"SELECT sub_category, AVG(numeric_rating) AS average_rating FROM {table_name} GROUP BY sub_category ORDER BY average_rating DESC",
                 "explanation": "This query calculates the average rating for each category."
             }
         ]
         return random.sample(examples, 3)
 
-    def query(self, table_name, condition=None, order_by=None, limit=None, group_by=None, aggregate=None, 
-              join_table=None, join_type=None, join_condition=None):
+    def compile_predicates(self, predicates, alias=None):
+        """Render plan predicates as a SQL condition, optionally qualified with a table alias"""
+        prefix = f"{alias}." if alias else ""
+        conditions = []
+        for predicate in predicates:
+            column = f"{prefix}{predicate.field}"
+            if predicate.op == "between":
+                low, high = predicate.value
+                conditions.append(f"{column} BETWEEN {low} AND {high}")
+            elif predicate.op == "gt":
+                conditions.append(f"{column} > {predicate.value}")
+            else:
+                raise ValueError(f"Unsupported predicate operator: {predicate.op}")
+        return " AND ".join(conditions)
+
+    def compile_aggregate(self, aggregate):
+        """Render one plan aggregate as a SQL expression"""
+        if aggregate.func == "count":
+            return "COUNT(*)"
+        return f"{aggregate.func.upper()}({aggregate.field})"
+
+    def compile_group(self, plan):
+        """
+        Compile a group-by with every aggregate computed in one GROUP BY
+        pass. With totals, WITH ROLLUP adds the row over all groups in the
+        same scan (MySQL 8.0.12+ for ORDER BY with ROLLUP).
+        """
+        condition = self.compile_predicates(plan.predicates)
+        select = ", ".join(f"{self.compile_aggregate(agg)} AS {agg.alias}" for agg in plan.aggregates)
+        order = f"{plan.aggregates[0].alias} DESC"
+        if plan.totals:
+            return f"""
+                SELECT {plan.group_by}, {select}, GROUPING({plan.group_by}) AS is_total
+                FROM {plan.table}
+                {f'WHERE {condition}' if condition else ''}
+                GROUP BY {plan.group_by} WITH ROLLUP
+                ORDER BY is_total, {order}
+            """
+        return f"""
+            SELECT {plan.group_by}, {select}
+            FROM {plan.table}
+            {f'WHERE {condition}' if condition else ''}
+            GROUP BY {plan.group_by}
+            ORDER BY {order}
+        """
+
+    def compile_join(self, plan):
+        """
+        Compile a two- or three-table join. Filters on the queried table are
+        applied in a derived table before joining, and the limit is applied
+        to the joined rows (and before the join when every join is a LEFT
+        JOIN, since each left row then yields at least one row).
+        """
+        table_name = plan.table
+        columns = [f"t1.id as {table_name}_id"] + [f"t1.{col}" for col in JOIN_COLUMNS]
+        condition = self.compile_predicates(plan.predicates)
+        limit = f"LIMIT {plan.limit}" if plan.limit else ""
+
+        if plan.join_mode != "rows":
+            # Semi-join / count related: one row per row of the queried table
+            conditions = [self.compile_predicates(plan.predicates, alias="t1")] if plan.predicates else []
+            columns.append("t1.sub_category as category")
+            counts = []
+            for number, join in enumerate(plan.joins, 2):
+                if plan.join_mode == "semi":
+                    conditions.append(f"EXISTS (SELECT 1 FROM {join.table} t{number} WHERE t{number}.{join.on} = t1.{join.on})")
+                    continue
+                # Related rows are counted once per category, not once per row
+                columns.append(f"COALESCE(r{number}.count, 0) AS {join.table}_count")
+                counts.append(f"""LEFT JOIN (
+                    SELECT {join.on}, COUNT(*) AS count FROM {join.table} GROUP BY {join.on}
+                ) r{number} ON r{number}.{join.on} = t1.{join.on}""")
+                if join.join_type == "INNER JOIN":
+                    conditions.append(f"r{number}.count IS NOT NULL")
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            return f"""
+                SELECT {', '.join(columns)}
+                FROM {table_name} t1
+                {' '.join(counts)}
+                {where}
+                {limit}
+            """
+
+        source = table_name
+        left_limit = limit if all(join.join_type == "LEFT JOIN" for join in plan.joins) else ""
+        if condition or left_limit:
+            source = f"(SELECT * FROM {table_name} {f'WHERE {condition}' if condition else ''} {left_limit})"
+        if len(plan.joins) == 2:  # Three-table joins.
+            first, second = plan.joins
+            columns += [
+                "t1.sub_category as main_category",
+                f"t2.id as {first.table}_id",
+                "t2.sub_category as related_category1",
+                f"t3.id as {second.table}_id",
+                "t3.sub_category as related_category2",
+            ]
+        else:  # Two-table join.
+            join = plan.joins[0]
+            columns += [
+                "t1.sub_category as category",
+                f"t2.id as {join.table}_id",
+                "t2.sub_category as related_category",
+            ]
+        joins = "\n".join(
+            f"{join.join_type} {join.table} t{number} ON t1.{join.on} = t{number}.{join.on}"
+            for number, join in enumerate(plan.joins, 2)
+        )
+        return f"""
+            SELECT {', '.join(columns)}
+            FROM {source} t1
+            {joins}
+            {limit}
+        """
+
+    def category_counts(self, table_name, columns, predicates=()):
+        """Number of rows of a table per combination of values of `columns`"""
+        condition = self.compile_predicates(predicates)
+        query = f"""
+            SELECT {', '.join(columns)}, COUNT(*) AS count
+            FROM {table_name}
+            {f'WHERE {condition}' if condition else ''}
+            GROUP BY {', '.join(columns)}
+        """
+        return {tuple(row[col] for col in columns): row["count"] for row in self._stream_query(query)}
+
+    def estimate_join_rows(self, plan):
+        """
+        Exact number of rows a "rows" join returns before its limit, from
+        per-category counts of each table instead of running the join.
+        """
+        keys = [join.on for join in plan.joins]
+        left = self.category_counts(plan.table, keys, plan.predicates)
+        related = [self.category_counts(join.table, [join.on]) for join in plan.joins]
+        total = 0
+        for values, count in left.items():
+            rows = count
+            for join, value, counts in zip(plan.joins, values, related):
+                matches = counts.get((value,), 0)
+                if join.join_type == "LEFT JOIN":
+                    matches = max(matches, 1)
+                rows *= matches
+            total += rows
+        return total
+
+    def guard_join(self, plan):
+        """
+        Return the plan to run: an unbounded join estimated above
+        max_join_rows is downgraded to "count related" with a warning.
+        """
+        if not plan.joins or plan.join_mode != "rows" or plan.limit:
+            return plan
+        estimate = self.estimate_join_rows(plan)
+        if estimate <= self.max_join_rows:
+            return plan
+        print(cf.warning(f"This join would return about {estimate:,} rows (limit {self.max_join_rows:,}); "
+                         f"showing the number of related rows instead. Add 'limit N records' to see joined rows."))
+        return replace(plan, join_mode="count")
+
+    def summary_statements(self, table_name):
+        """
+        Statements that rebuild the category summary of a loaded table and
+        record the import, to be run in one transaction.
+        """
+        import_id = uuid.uuid4().hex
+        imported_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        statements = [f"DELETE FROM category_summary WHERE table_name = '{table_name}'"]
+        for group_column in SUMMARY_GROUPS:
+            statements.append(f"""
+                INSERT INTO category_summary (table_name, group_column, category, import_id, row_count,
+                    avg_rating, min_rating, max_rating, total_reviews, avg_price, min_price, max_price)
+                SELECT '{table_name}', '{group_column}', {group_column}, '{import_id}', COUNT(*),
+                    AVG(numeric_rating), MIN(numeric_rating), MAX(numeric_rating), SUM(numeric_no_of_ratings),
+                    AVG(numeric_price), MIN(numeric_price), MAX(numeric_price)
+                FROM {table_name}
+                GROUP BY {group_column}
+            """)
+        statements.append(f"DELETE FROM import_metadata WHERE table_name = '{table_name}'")
+        statements.append(f"""
+            INSERT INTO import_metadata (table_name, import_id, row_count, imported_at)
+            SELECT '{table_name}', '{import_id}', COUNT(*), '{imported_at}' FROM {table_name}
+        """)
+        return statements
+
+    def manifest_statements(self, table_name, source_hash, columns, row_count):
+        """Statements that record the CSV file a table was loaded or synced from"""
+        synced_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        return [
+            f"DELETE FROM import_manifest WHERE table_name = '{table_name}'",
+            f"""
+                INSERT INTO import_manifest (table_name, source_hash, column_list, row_count, synced_at)
+                VALUES ('{table_name}', '{source_hash}', '{",".join(columns)}', {row_count}, '{synced_at}')
+            """,
+        ]
+
+    def summary_current(self, table_name):
+        """Whether category_summary was built by the last completed import of a table"""
+        query = f"""
+            SELECT m.import_id
+            FROM import_metadata m
+            JOIN category_summary s ON s.table_name = m.table_name AND s.import_id = m.import_id
+            WHERE m.table_name = '{table_name}'
+            LIMIT 1
+        """
+        try:
+            return bool(list(self._stream_query(query)))
+        except Exception:
+            # e.g. a database imported before the summary tables existed
+            return False
+
+    def compile_summary(self, plan):
+        """Answer a group-by from category_summary, reading one row per category"""
+        select = ", ".join(f"{column} AS {agg.alias}" for column, agg in zip(plan.summary_columns, plan.aggregates))
+        return f"""
+            SELECT category AS {plan.group_by}, {select}
+            FROM category_summary
+            WHERE table_name = '{plan.table}' AND group_column = '{plan.group_by}'
+              AND import_id = (SELECT import_id FROM import_metadata WHERE table_name = '{plan.table}')
+            ORDER BY {plan.aggregates[0].alias} DESC
+        """
+
+    def compile_plan(self, plan):
+        """Compile a QueryPlan into the SQL statement to execute"""
+        table_name = plan.table
+        if plan.summary_columns and self.summary_current(table_name):
+            # Precomputed at import; no scan of the table
+            query = self.compile_summary(plan)
+        elif plan.group_by:  # Prioritize handling grouped queries.
+            query = self.compile_group(plan)
+        elif plan.joins:  # Next, handle join queries.
+            query = self.compile_join(plan)
+        else:  # handle normal queries
+            condition = self.compile_predicates(plan.predicates)
+            query = f"SELECT {', '.join(plan.columns)} FROM {table_name}"
+            if condition:
+                query += f" WHERE {condition}"
+            if plan.sort:
+                query += f" ORDER BY {plan.sort.field} {'DESC' if plan.sort.descending else 'ASC'}"
+            if plan.limit:
+                query += f" LIMIT {plan.limit}"
+        return query
+
+    def _stream_query(self, query):
+        """Yield the rows of a query from an unbuffered cursor, FETCH_SIZE rows at a time"""
+        with self.pool.connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            try:
+                cursor.execute(query)
+                while True:
+                    rows = cursor.fetchmany(FETCH_SIZE)
+                    if not rows:
+                        break
+                    yield from rows
+            finally:
+                # Discard what the caller did not read so the connection can be reused
+                if connection.unread_result:
+                    connection.consume_results()
+                cursor.close()
+
+    def _stream_plan(self, plan, query):
+        """Yield the rows of the compiled query of an already guarded plan, through the result cache"""
+        return self.result_cache.stream(query, plan.tables, lambda: self._stream_query(query))
+
+    def iter_plan(self, plan):
+        """Run a plan without any prompts and yield the result rows as they arrive"""
+        plan = self.guard_join(plan)
+        return self._stream_plan(plan, self.compile_plan(plan))
+
+    def execute_plan(self, plan):
+        """Run a plan without any prompts and return the result rows"""
+        return list(self.iter_plan(plan))
+
+    def query(self, plan):
         """
         Perform SQL query with optional filtering, grouping, aggregation and joins.
         """
         print(cf.header("QUERY EXECUTION"))
+        table_name = plan.table
 
         # Get random examples
         examples = self.get_random_sql_examples(table_name)
@@ -162,105 +1072,25 @@ class SQLDatabaseHandler:
 
         # Current query
         print(f"\n{cf.info('Current Query:')}")
-        # Modify the query construction section.
-        if group_by:  # Prioritize handling grouped queries.
-            if aggregate == "COUNT(*)":
-                query = f"""
-                    SELECT {group_by}, COUNT(*) as count 
-                    FROM {table_name}
-                    {f'WHERE CAST(ratings AS DECIMAL(10,2)) > 4' if 'ratings > 4' in condition else f'WHERE {condition}' if condition else ''}
-                    GROUP BY {group_by}
-                    ORDER BY count DESC
-                """
-            elif "AVG" in str(aggregate):  # Handle average value queries.
-                query = f"""
-                    SELECT {group_by}, {aggregate} as average_rating
-                    FROM {table_name}
-                    {f'WHERE {condition}' if condition else ''}
-                    GROUP BY {group_by}
-                    ORDER BY average_rating DESC
-                """
-            else:
-                query = f"""
-                    SELECT {group_by}, {aggregate}
-                    FROM {table_name}
-                    {f'WHERE {condition}' if condition else ''}
-                    GROUP BY {group_by}
-                """
-        elif join_table and join_type:  # Next, handle join queries.
-            if "," in join_table:  # Three-table joins.
-                tables = join_table.split(",")
-                query = f"""SELECT 
-                    t1.id as {table_name}_id,
-                    t1.name,
-                    t1.ratings,
-                    t1.no_of_ratings,
-                    t1.discount_price,
-                    t1.actual_price,
-                    t1.sub_category as main_category,
-                    t2.id as {tables[0]}_id,
-                    t2.sub_category as related_category1,
-                    t3.id as {tables[1]}_id,
-                    t3.sub_category as related_category2
-                FROM {table_name} t1
-                {join_type} {tables[0]} t2 ON t1.sub_category = t2.sub_category
-                {join_type} {tables[1]} t3 ON t1.main_category = t3.main_category"""
-                # Modify field references in the condition
-                if condition:
-                    condition = condition.replace("discount_price", "t1.discount_price")
-                    condition = condition.replace("actual_price", "t1.actual_price")
-                    condition = condition.replace("ratings", "t1.ratings")
-                    condition = condition.replace("no_of_ratings", "t1.no_of_ratings")
-                    condition = condition.replace("sub_category", "t1.sub_category")
-                    query += f" WHERE {condition}"
-            else:  # Two-table join.
-                query = f"""
-                    SELECT 
-                        t1.id as {table_name}_id,
-                        t1.name,
-                        t1.ratings,
-                        t1.no_of_ratings,
-                        t1.discount_price,
-                        t1.actual_price,
-                        t1.sub_category as category,
-                        t2.id as {join_table}_id,
-                        t2.sub_category as related_category
-                    FROM {table_name} t1
-                    {join_type} {join_table} t2 ON t1.sub_category = t2.sub_category
-                """
-                # Modify field references in conditions
-                if condition:
-                    # Use regular expressions for exact replacement
-                    modified_condition = condition
-                    field_mappings = {
-                        r'\bno_of_ratings\b': "t1.no_of_ratings",
-                        r'\bdiscount_price\b': "t1.discount_price",
-                        r'\bactual_price\b': "t1.actual_price",
-                        r'\bratings\b': "t1.ratings",
-                        r'\bsub_category\b': "t1.sub_category"
-                    }
-                    for pattern, replacement in field_mappings.items():
-                        modified_condition = re.sub(pattern, replacement, modified_condition)
-                    query += f" WHERE {modified_condition}"
-        else:  # handle normal queries
-            query = f"SELECT * FROM {table_name}"
-            if condition:
-                query += f" WHERE {condition}"
-            if order_by:
-                query += f" ORDER BY {order_by}"
-            if limit:
-                query += f" LIMIT {limit}"
-
+        query = self.compile_plan(plan)
         print(cf.highlight(query))
         
         print(f"{cf.info('Query Explanation:')}")
         explanation = "This query retrieves data"
-        if condition:
+        if plan.predicates:
             explanation += " with specified conditions"
-        if order_by:
+        if plan.join_mode == "semi":
+            explanation += " that have related rows in the joined tables"
+        elif plan.join_mode == "count":
+            explanation += " with the number of related rows in each joined table"
+        if plan.group_by:
+            explanation += f", computing {', '.join(agg.alias for agg in plan.aggregates)} per {plan.group_by} in one pass"
+            if plan.totals:
+                explanation += " plus a row over all groups"
+        if plan.sort:
             explanation += " and sorts the results"
-        if limit:
-            explanation += f", returning up to {limit} records"
+        if plan.limit:
+            explanation += f", returning up to {plan.limit} records"
         print(cf.highlight(explanation + "."))
 
         # Modify the execution confirmation section
@@ -276,46 +1106,32 @@ class SQLDatabaseHandler:
 
         # Execute the query and display the results
         try:
-            connection = mysql.connector.connect(
-                host=self.host,
-                port=self.port,
-                user=self.user,
-                password=self.password,
-                database=self.database
-            )
-            cursor = connection.cursor(dictionary=True)
-            
+            # An oversized join is downgraded here, so that a failed estimate is reported like the query's own errors
+            guarded = self.guard_join(plan)
+            if guarded is not plan:
+                plan, query = guarded, self.compile_plan(guarded)
+
             # Print the SQL statements actually executed for debugging
             print(f"\nExecuting SQL: {query}")
-            
-            cursor.execute(query)
-            results = cursor.fetchall()
-            
-            print(cf.success(f"\nFound {len(results)} records"))
             print(cf.separator())
-            
-            if group_by:
+
+            # Rows are printed as they arrive; the total is known at the end
+            found = 0
+            if plan.group_by:
                 # Modify the display of group query results
-                for result in results:
-                    category = result.get(group_by)  # Get the group field directly
-                    if category is None:
+                for result in self._stream_plan(plan, query):
+                    found += 1
+                    category = result.get(plan.group_by)  # Get the group field directly
+                    if result.get("is_total"):
+                        category = "All categories"
+                    elif category is None:
                         continue
-                    
-                    if 'count' in result:
-                        count = result.get('count', 0)
-                        print(cf.highlight(f"Category: {category}, Count: {count}"))
-                    elif 'average_rating' in result:
-                        avg_rating = result.get('average_rating', 0)
-                        print(cf.highlight(f"Category: {category}, Average Rating: {avg_rating:.2f}"))
-                    else:
-                        # Processing other aggregation results
-                        value = next((v for k, v in result.items() if k != group_by), None)
-                        if value is not None:
-                            print(cf.highlight(f"Category: {category}, Value: {value}"))
+                    print(cf.highlight(self.format_group(category, result, plan.aggregates)))
 
             else:
                 # Normal query results display
-                for result in results:
+                for result in self._stream_plan(plan, query):
+                    found += 1
                     formatted_result = {
                         "Name": result.get("name", "")[:50] + "..." if len(result.get("name", "")) > 50 else result.get("name", ""),
                         "Rating": self.format_value(result.get("ratings"), "ratings"),
@@ -323,9 +1139,12 @@ class SQLDatabaseHandler:
                         "Price": self.format_value(result.get("discount_price"), "discount_price"),
                         "Original": self.format_value(result.get("actual_price"), "actual_price")
                     }
+                    if plan.join_mode == "count":
+                        formatted_result["Related"] = {join.table: result.get(f"{join.table}_count") for join in plan.joins}
                     print(cf.highlight(formatted_result))
             
             print(cf.separator())
+            print(cf.success(f"Found {found} records"))
 
             # Add interactive options after displaying results
             while True:
@@ -344,12 +1163,12 @@ class SQLDatabaseHandler:
                     return "modify"
                 elif choice == "2":
                     template = f"show me {table_name.replace('_', ' ')}"
-                    if condition:
+                    if plan.predicates:
                         template += " with similar conditions"
-                    if order_by:
+                    if plan.sort:
                         template += " and sorting"
-                    if limit != 5:
-                        template += f" limit {limit} records"
+                    if plan.limit != 5:
+                        template += f" limit {plan.limit} records"
                     print(cf.info(f"\nTemplate: {template}"))
                     print(cf.info("Please enter your similar query:"))
                     return "similar"
@@ -373,11 +1192,8 @@ class SQLDatabaseHandler:
                 else:
                     print(cf.error("Invalid choice. Please enter a number between 1 and 6."))
 
-            return results
+            return found
             
-        except mysql.connector.Error as e:
+        except self.database_error as e:
             print(cf.error(f"Database error: {e}"))
             return "error"
-        finally:
-            if 'connection' in locals() and connection.is_connected():
-                connection.close()
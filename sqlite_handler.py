@@ -0,0 +1,277 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from column_cache import file_hash
+from console_utils import ConsoleFormatter as cf
+from csv_reader import LINK_COLUMNS, CSVReader
+from query_plan import MAX_JOIN_ROWS
+from result_cache import ResultCache
+from sql_handler import (CHECKPOINT_ROWS, FETCH_SIZE, NUMERIC_COLUMN_TYPES, SUMMARY_TABLES, TABLE_INDEXES,
+                         RejectedRows, SQLDatabaseHandler, rejects_path_for)
+
+# MySQL constructs in generated SQL and their SQLite equivalents
+MYSQL_TRANSLATIONS = [
+    (re.compile(r"\bAS\s+DECIMAL\s*(\(\s*\d+\s*(,\s*\d+\s*)?\))?", re.IGNORECASE), "AS REAL"),
+    (re.compile(r"\bAS\s+(SIGNED|UNSIGNED)(\s+INTEGER)?\b", re.IGNORECASE), "AS INTEGER"),
+]
+
+
+def translate_sql(query):
+    """Rewrite the MySQL-specific parts of a generated query for SQLite"""
+    for pattern, replacement in MYSQL_TRANSLATIONS:
+        query = pattern.sub(replacement, query)
+    return query
+
+
+def sqlite_column_type(sql_type):
+    """Map a MySQL column type to its SQLite affinity"""
+    if sql_type == "INT":
+        return "INTEGER"
+    if sql_type.startswith("DECIMAL"):
+        return "REAL"
+    return "TEXT"
+
+
+class SQLiteDatabaseHandler(SQLDatabaseHandler):
+    """
+    Embedded SQLite backend with the same query() contract as
+    SQLDatabaseHandler. It runs the SQL generated for MySQL after
+    translating the MySQL-isms, and builds its tables and indexes from the
+    CSV files on first use.
+    """
+
+    placeholder = "?"
+    database_error = sqlite3.Error
+
+    def __init__(self, db_path, folder_path=None, selected_files=None, cache_size=256, cache_ttl=300,
+                 max_join_rows=MAX_JOIN_ROWS):
+        self.db_path = db_path
+        self.database = os.path.basename(db_path)
+        self.folder_path = folder_path
+        self.selected_files = selected_files or []
+        # One connection shared by all threads; the lock serializes access to it
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        # Held while the tables are checked and built, so that only one thread imports them
+        self._tables_lock = threading.Lock()
+        self.result_cache = ResultCache(max_entries=cache_size, ttl=cache_ttl)
+        self.max_join_rows = max_join_rows
+        self._tables_checked = False
+
+    def get_stats(self):
+        """Return runtime statistics of this handler"""
+        return {"result_cache": self.result_cache.stats()}
+
+    def close(self):
+        """Close the SQLite connection"""
+        self.connection.close()
+
+    @contextmanager
+    def _import_connection(self, use_load_data=False):
+        """The shared connection, held under the lock until the work on it is committed or rolled back"""
+        with self.lock:
+            try:
+                yield self.connection
+            except BaseException:
+                self.connection.rollback()
+                raise
+
+    def table_name(self, file):
+        """Table name used for a CSV file"""
+        return file.replace(" ", "_").replace(".csv", "").lower()
+
+    def ensure_tables(self):
+        """Import the CSV files the first time the database is used"""
+        if self._tables_checked:
+            return
+        with self._tables_lock:
+            # Another thread may have built the tables while this one waited
+            if self._tables_checked:
+                return
+            with self.lock:
+                existing = {row[0] for row in
+                            self.connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+                # Tables of an import that stopped part-way are finished by resuming it
+                if "import_checkpoint" in existing:
+                    existing -= {row[0] for row in self.connection.execute("SELECT table_name FROM import_checkpoint")}
+            missing = [file for file in self.selected_files if self.table_name(file) not in existing]
+            if missing and self.folder_path:
+                print(cf.info(f"Building SQLite tables from {self.folder_path}..."))
+                self.create_database_and_tables(self.folder_path, missing)
+            self._tables_checked = True
+
+    def create_database_and_tables(self, folder_path, selected_files, batch_size=5000, create_indexes=True,
+                                   drop_links=False, checkpoint_rows=CHECKPOINT_ROWS, resume=True):
+        """
+        Import selected CSV files as SQLite tables, with the same numeric
+        columns and secondary indexes as the MySQL import. Each CSV is
+        streamed in chunks of `batch_size` rows; `drop_links=True` leaves out
+        the image and link columns. Rows carry the keys sync_tables matches on.
+
+        As in the MySQL import, rows are committed every `checkpoint_rows`
+        rows, an interrupted import resumes after its last checkpoint unless
+        `resume=False`, and refused rows go to rejected_rows/<file>.csv.
+        """
+        print(cf.header("DATABASE IMPORT PROCESS"))
+        print(f"\n{cf.info('Database file:')} {cf.highlight(self.db_path)}")
+
+        total_inserted = 0
+        total_elapsed = 0.0
+        for file in selected_files:
+            file_path = os.path.join(folder_path, file)
+            table_name = self.table_name(file)
+
+            print(f"\n{cf.info('Processing file:')} {cf.highlight(file)}")
+            print(f"{cf.info('Table name:')} {cf.highlight(table_name)}")
+
+            reader = CSVReader(file_path, chunk_rows=batch_size, drop_columns=LINK_COLUMNS if drop_links else (),
+                               row_keys=True)
+            output_columns = reader.output_columns()
+            column_names = [col.replace(' ', '_') for col in output_columns]
+            columns = ["id INTEGER PRIMARY KEY AUTOINCREMENT"]
+            columns.extend(f"{col} {sqlite_column_type(NUMERIC_COLUMN_TYPES.get(col, 'TEXT'))}" for col in column_names)
+
+            start = time.perf_counter()
+            with self.lock:
+                cursor = self.connection.cursor()
+                source_hash = file_hash(file_path)
+                for statement in SUMMARY_TABLES:
+                    cursor.execute(statement)
+                checkpoint = self._load_checkpoint(cursor, table_name, source_hash, output_columns) if resume else None
+                # Mark the summary and the sync manifest stale before the rows change
+                cursor.execute(f"DELETE FROM import_metadata WHERE table_name = '{table_name}'")
+                cursor.execute(f"DELETE FROM import_manifest WHERE table_name = '{table_name}'")
+                self.result_cache.invalidate(table_name)
+                if checkpoint and checkpoint[2]:
+                    start_row, rejected_before, loaded = checkpoint
+                    print(cf.warning(f"Finishing {table_name}, whose rows an earlier import already loaded"))
+                elif checkpoint:
+                    start_row, rejected_before, loaded = checkpoint
+                    print(cf.warning(f"Resuming {table_name} after row {start_row}, where an earlier import stopped"))
+                    reader.seen_keys = {row[0] for row in cursor.execute(f"SELECT row_key FROM {table_name}")}
+                    reader.start_row = start_row
+                else:
+                    start_row, rejected_before, loaded = 0, 0, False
+                    cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+                    cursor.execute(f"CREATE TABLE {table_name} ({', '.join(columns)})")
+                    for statement in self.checkpoint_statements(table_name, source_hash, output_columns, 0, 0):
+                        cursor.execute(statement)
+                    self.connection.commit()
+                rejects = RejectedRows(rejects_path_for(file_path), column_names, append=checkpoint is not None)
+
+                def save_checkpoint(rows_done, rows_rejected):
+                    # The rows and the progress that covers them are committed together
+                    rejects.flush()
+                    for statement in self.checkpoint_statements(table_name, source_hash, output_columns, rows_done,
+                                                                rejected_before + rows_rejected):
+                        cursor.execute(statement)
+                    self.connection.commit()
+
+                inserted, rejected = 0, 0
+                if not loaded:
+                    try:
+                        inserted, rejected = self._insert_batches(self.connection, cursor, reader, table_name,
+                                                                  column_names, batch_size, rejects, start_row,
+                                                                  checkpoint_rows, save_checkpoint)
+                    except BaseException:
+                        # Back to the last checkpoint, so a Ctrl-C leaves a resumable table
+                        self.connection.rollback()
+                        raise
+                    finally:
+                        rejects.close()
+                    # The last rows are committed with a checkpoint saying they are all in, so
+                    # an import that stops while building indexes does not load them again
+                    for statement in self.checkpoint_statements(table_name, source_hash, output_columns,
+                                                                start_row + inserted + rejected,
+                                                                rejected_before + rejected, loaded=True):
+                        cursor.execute(statement)
+                cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{table_name}_row_key ON {table_name} (row_key)")
+                self.connection.commit()
+            elapsed = time.perf_counter() - start
+
+            total_inserted += inserted
+            total_elapsed += elapsed
+            rate = inserted / elapsed if elapsed > 0 else 0
+            print(cf.success(f"Successfully inserted {inserted} records in {elapsed:.2f}s ({rate:,.0f} rows/sec)"))
+            if rejected_before + rejected:
+                print(cf.warning(f"{table_name}: {rejected_before + rejected} rows rejected, see {rejects.path}"))
+
+            if create_indexes:
+                self._create_indexes(table_name, column_names)
+
+            with self.lock:
+                for statement in self.summary_statements(table_name):
+                    self.connection.execute(statement)
+                # Rejected rows leave the table incomplete, so syncs import it in full
+                if rejected_before + rejected == 0:
+                    for statement in self.manifest_statements(table_name, source_hash, output_columns,
+                                                              start_row + inserted):
+                        self.connection.execute(statement)
+                self.connection.execute(f"DELETE FROM import_checkpoint WHERE table_name = '{table_name}'")
+                self.connection.commit()
+            # Results cached by queries that ran during the import may be partial
+            self.result_cache.invalidate(table_name)
+            print(cf.success(f"Refreshed category summary of {table_name}"))
+
+        total_rate = total_inserted / total_elapsed if total_elapsed > 0 else 0
+        print(f"\n{cf.success(f'Successfully imported all files into SQLite database `{self.db_path}`')}")
+        print(cf.info(f"Total: {total_inserted} records in {total_elapsed:.2f}s ({total_rate:,.0f} rows/sec)"))
+        self._tables_checked = True
+
+    def _create_indexes(self, table_name, table_columns):
+        """Create the secondary indexes in TABLE_INDEXES whose columns exist in the table"""
+        created = []
+        with self.lock:
+            for suffix, index_columns in TABLE_INDEXES.items():
+                if not all(col in table_columns for col in index_columns):
+                    continue
+                index_name = f"idx_{table_name}_{suffix}"
+                self.connection.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} ({', '.join(index_columns)})")
+                created.append(index_name)
+            self.connection.execute(f"ANALYZE {table_name}")
+            self.connection.commit()
+        print(cf.success(f"Created {len(created)} indexes: {', '.join(created)}"))
+
+    def compile_group(self, plan):
+        """SQLite has no WITH ROLLUP: the totals row comes from a second SELECT"""
+        if not plan.totals:
+            return super().compile_group(plan)
+        condition = self.compile_predicates(plan.predicates)
+        where = f"WHERE {condition}" if condition else ""
+        select = ", ".join(f"{self.compile_aggregate(agg)} AS {agg.alias}" for agg in plan.aggregates)
+        return f"""
+            SELECT {plan.group_by}, {select}, 0 AS is_total
+            FROM {plan.table}
+            {where}
+            GROUP BY {plan.group_by}
+            UNION ALL
+            SELECT NULL, {select}, 1
+            FROM {plan.table}
+            {where}
+            ORDER BY is_total, {plan.aggregates[0].alias} DESC
+        """
+
+    def compile_plan(self, plan):
+        """Compile a QueryPlan with the MySQL compiler and translate it for SQLite"""
+        return translate_sql(super().compile_plan(plan))
+
+    def _stream_query(self, query):
+        """Yield the rows of a query, FETCH_SIZE rows at a time"""
+        self.ensure_tables()
+        with self.lock:
+            cursor = self.connection.execute(query)
+        try:
+            while True:
+                # Other threads may use the connection between batches
+                with self.lock:
+                    rows = cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(row)
+        finally:
+            cursor.close()
@@ -0,0 +1,109 @@
+"""
+Parity of the in-memory engine with the SQLite handler on the archive CSVs.
+
+Every plan is run through both handlers' execute_plan and the rows are
+compared after normalizing driver types; query() is driven with scripted
+answers to the prompts, so the interactive path is covered as well.
+
+    python -m pytest tests
+"""
+import builtins
+import contextlib
+import io
+import math
+import os
+import sys
+import unittest
+from unittest import mock
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from main import DATA_FOLDER, SELECTED_FILES
+from memory_handler import MemoryDatabaseHandler
+from sqlite_handler import SQLiteDatabaseHandler
+from utils import parse_natural_language
+
+# One question per plan shape. Rows of equal sort keys may come in any order,
+# so sorted results are compared on their sequence of sort keys
+ORDERED_QUESTIONS = [
+    "show me appliances in ascending price limit 20 records",
+    "show me air conditioners with rating greater than 4 in descending price limit 15 records",
+]
+UNORDERED_QUESTIONS = [
+    "show me appliances with rating greater than 4 and comments greater than 1000",
+    "show me appliances with price between 1000 and 5000",
+    "show total number of appliances group by category",
+    "show average rating for air conditioners group by main category",
+    "show total number of appliances with rating greater than 4 group by category",
+    "show total number, average rating and price range of appliances group by category with totals",
+    "show me air conditioners including appliances",
+    "show me air conditioners having related appliances",
+    "show me appliances together with air conditioners connected to car and motorbike products count related",
+]
+
+
+def normalize(value):
+    """Compare numbers by value whatever their driver type, and NaN as NULL"""
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float):
+        return None if math.isnan(value) else round(value, 6)
+    return value
+
+
+def normalize_rows(rows):
+    return [tuple(sorted((key, normalize(value)) for key, value in dict(row).items())) for row in rows]
+
+
+class MemoryParityTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with contextlib.redirect_stdout(io.StringIO()):
+            cls.sqlite = SQLiteDatabaseHandler(":memory:", cache_size=0)
+            cls.sqlite.create_database_and_tables(DATA_FOLDER, SELECTED_FILES)
+            cls.memory = MemoryDatabaseHandler(DATA_FOLDER, SELECTED_FILES, cache_size=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.sqlite.close()
+        cls.memory.close()
+
+    def run_both(self, plan):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.memory.execute_plan(plan), self.sqlite.execute_plan(plan)
+
+    def test_ordered_plans(self):
+        for question in ORDERED_QUESTIONS:
+            with self.subTest(question=question):
+                plan = parse_natural_language(question)
+                memory_rows, sqlite_rows = self.run_both(plan)
+                self.assertTrue(sqlite_rows)
+                self.assertEqual([normalize(row[plan.sort.field]) for row in memory_rows],
+                                 [normalize(row[plan.sort.field]) for row in sqlite_rows])
+
+    def test_unordered_plans(self):
+        for question in UNORDERED_QUESTIONS:
+            with self.subTest(question=question):
+                memory_rows, sqlite_rows = self.run_both(parse_natural_language(question))
+                self.assertEqual(sorted(normalize_rows(memory_rows), key=repr),
+                                 sorted(normalize_rows(sqlite_rows), key=repr))
+
+    def test_interactive_query(self):
+        # Execute the query, then return to the main menu
+        for handler in (self.memory, self.sqlite):
+            for question in ("show me appliances with rating greater than 4.5 limit 5 records",
+                             "show total number of appliances group by category with totals"):
+                with self.subTest(handler=type(handler).__name__, question=question):
+                    answers = iter(["yes", "5"])
+                    output = io.StringIO()
+                    with mock.patch.object(builtins, "input", lambda *args: next(answers)), \
+                            contextlib.redirect_stdout(output):
+                        result = handler.query(parse_natural_language(question))
+                    self.assertEqual(result, "exit")
+                    self.assertIn("Found", output.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
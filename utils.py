@@ -1,5 +1,8 @@
 import re
+from functools import lru_cache
 from console_utils import ConsoleFormatter as cf
+from query_plan import (QueryPlan, Predicate, Sort, Join, COUNT, AVG_RATING, MIN_RATING, MAX_RATING,
+                        TOTAL_REVIEWS, AVG_PRICE, MIN_PRICE, MAX_PRICE)
 
 # Synonym Mapping
 SHOW_SYNONYMS = {
@@ -58,176 +61,165 @@ def get_similar_queries(table_name, error_type):
     }
     return suggestions.get(error_type, [])
 
-def parse_natural_language(question, db_type):
-    """Parse a natural language question into query parameters"""
-    try:
-        # Normalize the query command
-        normalized_question = normalize_command(question)
-        
-        table_map = {
-            "air conditioners": "air_conditioners",
-            "appliances": "all_appliances",
-            "car and motorbike products": "all_car_and_motorbike_products",
-        }
-
-        table_name = None
-        condition = None
-        order_by = None
-        limit = None
-        group_by = None
-        aggregate = None
-        join_table = None
-        join_type = None
-        join_condition = None
-
-        # Detect the table or category
-        for key, value in table_map.items():
-            if key in normalized_question.lower():
-                table_name = value
-                break
-
-        if not table_name:
-            raise ValueError("Could not identify the table from the question")
-
-        # Condition detection
-        conditions = []
+# Category phrase -> table/collection name
+TABLE_MAP = {
+    "air conditioners": "air_conditioners",
+    "appliances": "all_appliances",
+    "car and motorbike products": "all_car_and_motorbike_products",
+}
 
-        # Rating condition
-        if "rating greater than" in normalized_question.lower():
-            match = re.search(r"rating greater than (\d+\.?\d*)", normalized_question.lower())
-            if match:
-                rating_value = match.group(1)
-                if db_type == "sql":
-                    conditions.append(f"ratings > {rating_value}")
-                else:
-                    conditions.append(f"{{'ratings': {{'$gt': '{rating_value}'}}}}")
+# Two-table join phrase -> join type
+JOIN_KEYWORDS = {
+    "related to": "INNER JOIN",
+    "matching": "INNER JOIN",
+    "combined with": "INNER JOIN",
+    "including": "LEFT JOIN",
+    "along with": "LEFT JOIN",
+    "with all": "LEFT JOIN"
+}
 
-        # Comments condition
-        if "comments greater than" in normalized_question.lower():
-            match = re.search(r"comments greater than (\d+)", normalized_question.lower())
-            if match:
-                comments_value = match.group(1)
-                if db_type == "sql":
-                    conditions.append(f"no_of_ratings > {comments_value}")
-                else:
-                    conditions.append(f"{{'no_of_ratings': {{'$gt': '{comments_value}'}}}}")
+# Phrase -> QueryPlan.join_mode; on its own it also joins the two tables named
+JOIN_MODE_KEYWORDS = {
+    "having related": "semi",
+    "count related": "count",
+}
 
-        # Price condition
-        if "price greater than" in normalized_question.lower():
-            match = re.search(r"price greater than (\d+)", normalized_question.lower())
-            if match:
-                price_value = match.group(1)
-                if db_type == "sql":
-                    conditions.append(f"CAST(REPLACE(REPLACE(discount_price, '₹', ''), ',', '') AS DECIMAL) > {price_value}")
-                else:
-                    conditions.append(f"{{'$expr': {{'$gt': [{{'$toDouble': {{'$replaceAll': {{'input': {{'$replaceAll': {{'input': '$discount_price', 'find': '₹', 'replacement': ''}}, 'find': ',', 'replacement': ''}}}}}}, {price_value}]}}}}")
+# Aggregate phrase -> aggregates computed per group, in the order asked
+AGGREGATE_KEYWORDS = {
+    "total number": (COUNT,),
+    "average rating": (AVG_RATING,),
+    "minimum rating": (MIN_RATING,),
+    "maximum rating": (MAX_RATING,),
+    "total reviews": (TOTAL_REVIEWS,),
+    "average price": (AVG_PRICE,),
+    "minimum price": (MIN_PRICE,),
+    "maximum price": (MAX_PRICE,),
+    "price range": (MIN_PRICE, MAX_PRICE),
+}
 
-        # Price range condition
-        if "price between" in normalized_question.lower():
-            match = re.search(r"price between (\d+) and (\d+)", normalized_question.lower())
-            if match:
-                min_price, max_price = match.group(1), match.group(2)
-                if db_type == "sql":
-                    price_field = "CAST(REPLACE(REPLACE(discount_price, '₹', ''), ',', '') AS DECIMAL)"
-                    conditions.append(f"{price_field} BETWEEN {min_price} AND {max_price}")
-                else:
-                    conditions.append(f"{{'$expr': {{'$and': [{{'$gte': [{{'$toDouble': {{'$replaceAll': {{'input': {{'$replaceAll': {{'input': '$discount_price', 'find': '₹', 'replacement': ''}}, 'find': ',', 'replacement': ''}}}}}}, {min_price}]}}, {{'$lte': [{{'$toDouble': {{'$replaceAll': {{'input': {{'$replaceAll': {{'input': '$discount_price', 'find': '₹', 'replacement': ''}}, 'find': ',', 'replacement': ''}}}}}}, {max_price}]}}]}}}}")
+# Every phrase the parser understands, matched in a single left-to-right scan.
+# The leading word boundary and first-letter lookahead let the scan skip most
+# positions without trying each alternative; keep the letter set in sync with
+# the phrases below.
+TOKEN_PATTERN = re.compile(
+    r"\b(?=[acdghilmprtw])(?:"
+    r"(?P<table>" + "|".join(re.escape(key) for key in TABLE_MAP) + r")"
+    r"|rating greater than (?P<rating>\d+\.?\d*)"
+    r"|comments greater than (?P<comments>\d+)"
+    r"|price greater than (?P<price>\d+)"
+    r"|price between (?P<price_low>\d+) and (?P<price_high>\d+)"
+    r"|(?P<sort>ascending|descending) price"
+    r"|group by (?P<group>(?:main )?category)"
+    r"|(?P<aggregate>" + "|".join(re.escape(key) for key in AGGREGATE_KEYWORDS) + r")"
+    r"|(?P<totals>with totals)"
+    r"|(?P<together>together with)"
+    r"|(?P<connected>connected to)"
+    r"|(?P<join>" + "|".join(re.escape(key) for key in JOIN_KEYWORDS) + r")"
+    r"|(?P<mode>" + "|".join(re.escape(key) for key in JOIN_MODE_KEYWORDS) + r")"
+    r"|limit (?P<limit>\d+) records"
+    r")"
+)
 
-        # Combine conditions
-        if conditions:
-            if db_type == "sql":
-                condition = " AND ".join(conditions)
-            else:
-                condition = f"{{'$and': [" + ", ".join(conditions) + "]}"
+def _number(text):
+    """Convert a matched number to int when it has no fractional part"""
+    return int(text) if text.isdigit() else float(text)
 
-        # Sorting
-        if "ascending price" in normalized_question.lower():
-            if db_type == "sql":
-                order_by = "CAST(REPLACE(REPLACE(discount_price, '₹', ''), ',', '') AS DECIMAL) ASC"
-            else:
-                order_by = {"$sort": {"numeric_price": 1}}
-        elif "descending price" in normalized_question.lower():
-            if db_type == "sql":
-                order_by = "CAST(REPLACE(REPLACE(discount_price, '₹', ''), ',', '') AS DECIMAL) DESC"
-            else:
-                order_by = {"$sort": {"numeric_price": -1}}
+@lru_cache(maxsize=1024)
+def parse_normalized(normalized_question):
+    """
+    Parse an already normalized question into a QueryPlan.
 
-        # Grouping
-        if "group by category" in normalized_question.lower():
-            group_by = "sub_category"
-            
-            # average rating
-            if "average rating" in normalized_question.lower():
-                aggregate = "AVG(CAST(ratings AS DECIMAL(10,2)))"
-                # removing default limit
-                limit = None
-            elif "total number" in normalized_question.lower():
-                aggregate = "COUNT(*)"
-                limit = None
-            
-            # check for condition
-            if "with rating greater than" in normalized_question.lower():
-                match = re.search(r"rating greater than (\d+\.?\d*)", normalized_question.lower())
-                if match:
-                    rating_value = match.group(1)
-                    condition = f"ratings > {rating_value}"
+    Results are cached: plans are immutable, and clients tend to resend the
+    same phrasings.
+    """
+    tables = []
+    predicates = []
+    sort = None
+    limit = None
+    group_by = None
+    aggregates = []
+    totals = False
+    join_type = None
+    join_mode = "rows"
+    together = connected = False
 
-        # Join detection
-        join_keywords = {
-            "related to": "INNER JOIN",
-            "matching": "INNER JOIN",
-            "combined with": "INNER JOIN",
-            "including": "LEFT JOIN",
-            "along with": "LEFT JOIN",
-            "with all": "LEFT JOIN"
-        }
+    for match in TOKEN_PATTERN.finditer(normalized_question):
+        kind = match.lastgroup
+        if kind == "table":
+            table = TABLE_MAP[match.group("table")]
+            if table not in tables:
+                tables.append(table)
+        elif kind == "rating":
+            predicates.append(Predicate("numeric_rating", "gt", _number(match.group("rating"))))
+        elif kind == "comments":
+            predicates.append(Predicate("numeric_no_of_ratings", "gt", _number(match.group("comments"))))
+        elif kind == "price":
+            predicates.append(Predicate("numeric_price", "gt", _number(match.group("price"))))
+        elif kind == "price_high":
+            price_range = (_number(match.group("price_low")), _number(match.group("price_high")))
+            predicates.append(Predicate("numeric_price", "between", price_range))
+        elif kind == "sort":
+            if sort is None:
+                sort = Sort("numeric_price", descending=match.group("sort") == "descending")
+        elif kind == "group":
+            group_by = "main_category" if match.group("group").startswith("main") else "sub_category"
+        elif kind == "aggregate":
+            for aggregate in AGGREGATE_KEYWORDS[match.group("aggregate")]:
+                if aggregate not in aggregates:
+                    aggregates.append(aggregate)
+        elif kind == "totals":
+            totals = True
+        elif kind == "together":
+            together = True
+        elif kind == "connected":
+            connected = True
+        elif kind == "join":
+            if join_type is None:
+                join_type = JOIN_KEYWORDS[match.group("join")]
+        elif kind == "mode":
+            join_mode = JOIN_MODE_KEYWORDS[match.group("mode")]
+        elif kind == "limit":
+            limit = int(match.group("limit"))
 
-        # Three-table join keywords
-        three_table_keywords = {
-            "together with": "INNER JOIN",
-            "connected to": "INNER JOIN"
-        }
+    if not tables:
+        raise ValueError("Could not identify the table from the question")
+    # The first category mentioned is the one being queried
+    table_name, other_tables = tables[0], tables[1:]
 
-        # Check for three-table joins
-        if "together with" in normalized_question.lower() and "connected to" in normalized_question.lower():
-            join_tables = []
-            for key, value in table_map.items():
-                if key in normalized_question.lower() and value != table_name:
-                    join_tables.append(value)
-            
-            if len(join_tables) == 2:  # Ensure two additional tables are found
-                join_table = ",".join(join_tables)
-                join_type = "INNER JOIN"
-                join_condition = f"""ON t1.sub_category = t2.sub_category 
-                    INNER JOIN {join_tables[1]} t3 
-                    ON t1.main_category = t3.main_category"""
-            else:
-                print(cf.warning("\nThree-table join requires exactly two additional tables."))
-                print(cf.info("Example: show me appliances together with air conditioners connected to car and motorbike products"))
-                raise ValueError("Invalid three-table join syntax")
-        else:
-            # Detect two-table joins
-            for keyword, join_operation in join_keywords.items():
-                if keyword in normalized_question.lower():
-                    for key, value in table_map.items():
-                        if key in normalized_question.lower() and value != table_name:
-                            join_table = value
-                            join_type = join_operation
-                            # Determine the join condition based on the type of category
-                            if "sub_category" in str(table_name):
-                                join_condition = f"ON {table_name}.sub_category = {join_table}.sub_category"
-                            else:
-                                join_condition = f"ON {table_name}.main_category = {join_table}.main_category"
-                            break
-                    break
+    # Aggregates only apply to group-bys; a count when none was named
+    aggregates = tuple(aggregates or [COUNT]) if group_by else ()
 
-        # Set the limit only if explicitly specified
-        match = re.search(r"limit (\d+) records", normalized_question.lower())
-        if match:
-            limit = int(match.group(1))
+    joins = ()
+    if together and connected:
+        if len(other_tables) != 2:  # Ensure two additional tables are found
+            print(cf.warning("\nThree-table join requires exactly two additional tables."))
+            print(cf.info("Example: show me appliances together with air conditioners connected to car and motorbike products"))
+            raise ValueError("Invalid three-table join syntax")
+        joins = (
+            Join(other_tables[0], "INNER JOIN", "sub_category"),
+            Join(other_tables[1], "INNER JOIN", "main_category"),
+        )
+    elif join_type and other_tables:
+        joins = (Join(other_tables[0], join_type, "sub_category"),)
+    elif join_mode != "rows" and other_tables:
+        joins = (Join(other_tables[0], "INNER JOIN", "sub_category"),)
 
-        return table_name, condition, order_by, limit, group_by, aggregate, join_table, join_type, join_condition
+    return QueryPlan(
+        table=table_name,
+        predicates=tuple(predicates),
+        sort=sort,
+        limit=limit,
+        group_by=group_by,
+        aggregates=aggregates,
+        joins=joins,
+        join_mode=join_mode if joins else "rows",
+        totals=totals and bool(group_by)
+    )
 
+def parse_natural_language(question):
+    """Parse a natural language question into a QueryPlan"""
+    try:
+        return parse_normalized(normalize_command(question))
     except Exception as e:
         if "table" in str(e).lower():
             print(cf.warning("\nAvailable categories:"))
@@ -243,35 +235,33 @@ def demo_parse_natural_language():
     
     # Example natural language question
     question = "show me appliances with rating greater than 4.2 and comments greater than 3000"
-    db_type = "nosql"  # Assume SQL as the database type for this demo
     
     print(cf.info("Input Question:"))
     print(cf.highlight(question))
     
     try:
         # Parse the natural language question
-        table_name, condition, order_by, limit, group_by, aggregate, join_table, join_type, join_condition = parse_natural_language(question, db_type)
+        plan = parse_natural_language(question)
         
         # Display the parsed components
         print(cf.header("Parsed Query Components"))
-        print(cf.success(f"Table Name: {table_name}"))
-        if condition:
-            print(cf.info(f"Condition: {condition}"))
-        if order_by:
-            print(cf.info(f"Order By: {order_by}"))
-        if limit:
-            print(cf.info(f"Limit: {limit}"))
-        if group_by:
-            print(cf.info(f"Group By: {group_by}"))
-        if aggregate:
-            print(cf.info(f"Aggregate: {aggregate}"))
-        if join_table:
-            print(cf.info(f"Join Table: {join_table}"))
-            print(cf.info(f"Join Type: {join_type}"))
-            print(cf.info(f"Join Condition: {join_condition}"))
+        print(cf.success(f"Table Name: {plan.table}"))
+        for predicate in plan.predicates:
+            print(cf.info(f"Condition: {predicate.field} {predicate.op} {predicate.value}"))
+        if plan.sort:
+            print(cf.info(f"Order By: {plan.sort.field} {'DESC' if plan.sort.descending else 'ASC'}"))
+        if plan.limit:
+            print(cf.info(f"Limit: {plan.limit}"))
+        if plan.group_by:
+            print(cf.info(f"Group By: {plan.group_by}"))
+        for aggregate in plan.aggregates:
+            print(cf.info(f"Aggregate: {aggregate.func}({aggregate.field or '*'}) as {aggregate.alias}"))
+        for join in plan.joins:
+            print(cf.info(f"Join: {join.join_type} {join.table} ON {join.on}"))
     
     except Exception as e:
         print(cf.error(f"Error: {str(e)}"))
 
 # Run the demo
-demo_parse_natural_language()
+if __name__ == "__main__":
+    demo_parse_natural_language()